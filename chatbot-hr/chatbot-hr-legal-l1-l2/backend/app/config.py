@@ -0,0 +1,9 @@
+"""Process configuration.
+
+``.env`` is loaded exactly once, when this module is first imported; every
+module that reads settings at import time imports it first. Settings are
+still read with ``os.getenv`` where they are used.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,349 @@
+import os
+import re
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from ``Retry-After``/``x-ratelimit-reset-*`` values: ``"12"``, ``"7.66s"``, ``"2m59.56s"``, ``"120ms"``."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _UNITS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    return parse_duration(headers.get("retry-after"))
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimited(Exception):
+    """The request was not admitted, or upstream answered 429; retry after ``retry_after`` seconds."""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """``rate`` requests per second with bursts up to ``burst``; ``rate <= 0`` means unlimited."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a request may pass (0 = now)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+    def has_spare(self, now: float) -> bool:
+        """More than half the burst is available (always, when unlimited)."""
+        return self.wait_time(now) == 0 and (self.rate <= 0 or self.tokens >= self.burst / 2)
+
+
+class _Waiter:
+    __slots__ = ("key", "future")
+
+    def __init__(self, key: str, future: "asyncio.Future"):
+        self.key = key
+        self.future = future
+
+
+class Ticket:
+    """One admitted upstream call; release it exactly once (releasing twice is a no-op)."""
+
+    __slots__ = ("key", "released", "background")
+
+    def __init__(self, key: str, background: bool = False):
+        self.key = key
+        self.released = False
+        self.background = background
+
+
+class AdmissionController:
+    """Admission control in front of the upstream LLM.
+
+    A call is admitted when there is a free slot (ADMISSION_MAX_CONCURRENCY),
+    a token in the global bucket (ADMISSION_RATE/ADMISSION_BURST) and a token
+    in its API key's bucket (ADMISSION_KEY_RATE/ADMISSION_KEY_BURST, by
+    default the global rate, since all anonymous traffic uses the server key).
+    Otherwise it waits in a FIFO queue of at most ADMISSION_QUEUE_MAX entries
+    for up to ADMISSION_QUEUE_TIMEOUT_SECONDS. A full queue, or an expected
+    wait past the deadline, is rejected at once with RateLimited, so clients
+    get a quick 429 with Retry-After instead of a timeout.
+
+    Background work (conversation summaries) uses ``admit_background``. It
+    is admitted only when nobody is queued, at most ADMISSION_BACKGROUND_SHARE
+    of the slots are in use by it, and both buckets have more than half their
+    burst left; otherwise it is deferred, never queued.
+
+    ``observe`` feeds upstream responses back in. A 429 or exhausted
+    ``x-ratelimit-remaining-*`` budget pauses that key until the reset time,
+    and the key's rate is lowered to what its remaining requests allow.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("ADMISSION_ENABLED", "1") == "1"
+        self.max_concurrency = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+        self.queue_max = int(os.getenv("ADMISSION_QUEUE_MAX", "64"))
+        self.queue_timeout = _env_float("ADMISSION_QUEUE_TIMEOUT_SECONDS", 5.0)
+        rate, burst = _env_float("ADMISSION_RATE", 20.0), _env_float("ADMISSION_BURST", 40.0)
+        self.key_rate = _env_float("ADMISSION_KEY_RATE", rate)
+        self.key_burst = _env_float("ADMISSION_KEY_BURST", burst)
+        self.token_reserve = int(os.getenv("ADMISSION_TOKEN_RESERVE", "1000"))
+        self.max_keys = int(os.getenv("ADMISSION_MAX_KEYS", "1024"))
+        self.background_slots = max(1, int(self.max_concurrency * _env_float("ADMISSION_BACKGROUND_SHARE", 0.25)))
+        self.bucket = TokenBucket(rate, burst)
+        self._keys: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._queue: Deque[_Waiter] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.in_flight = 0
+        self.background_in_flight = 0
+        self.background_deferred = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.upstream_429 = 0
+        self.header_pauses = 0
+
+    @staticmethod
+    def _key_id(api_key: Optional[str]) -> str:
+        # buckets are per key, but the key itself is never kept
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else "default"
+
+    def _key_bucket(self, key: str) -> TokenBucket:
+        bucket = self._keys.get(key)
+        if bucket is None:
+            bucket = self._keys[key] = TokenBucket(self.key_rate, self.key_burst)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        self._keys.move_to_end(key)
+        return bucket
+
+    def _wait_time(self, key: str, now: float) -> float:
+        if self.in_flight >= self.max_concurrency:
+            return math.inf  # until a release
+        return max(self.bucket.wait_time(now), self._key_bucket(key).wait_time(now))
+
+    def _grant(self, key: str, background: bool = False) -> Ticket:
+        self.bucket.take()
+        self._key_bucket(key).take()
+        self.in_flight += 1
+        self.admitted += 1
+        if background:
+            self.background_in_flight += 1
+        return Ticket(key, background)
+
+    def _retry_hint(self, key: str, now: float) -> float:
+        paused = self._key_bucket(key).paused_until - now
+        drain = (len(self._queue) + 1) / self.bucket.rate if self.bucket.rate > 0 else 1.0
+        return max(paused, drain, 1.0)
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def acquire(self, api_key: Optional[str]) -> Ticket:
+        """Wait for admission; raises RateLimited when the queue is full or the deadline passes."""
+        key = self._key_id(api_key)
+        if not self.enabled:
+            self.in_flight += 1
+            return Ticket(key)
+        now = time.monotonic()
+        if not self._queue and self._wait_time(key, now) == 0:
+            return self._grant(key)
+
+        # reject up front what could not be admitted before the deadline anyway
+        expected = self._key_bucket(key).paused_until - now
+        if self.bucket.rate > 0:
+            expected = max(expected, len(self._queue) / self.bucket.rate)
+        if len(self._queue) >= self.queue_max or expected > self.queue_timeout:
+            self.rejected_full += 1
+            raise RateLimited("Too many chat requests in progress; retry later.", self._retry_hint(key, now))
+
+        waiter = _Waiter(key, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self.queued += 1
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wake()
+        try:
+            return await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                return waiter.future.result()
+            self.rejected_timeout += 1
+            raise RateLimited("Chat request waited too long for an upstream slot; retry later.",
+                              self._retry_hint(key, time.monotonic()))
+        except asyncio.CancelledError:
+            # the client went away; hand back a slot granted in the same instant
+            if waiter.future.done() and not waiter.future.cancelled():
+                await self.release(waiter.future.result())
+            raise
+        finally:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+
+    async def release(self, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        self.in_flight -= 1
+        if ticket.background:
+            self.background_in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, api_key: Optional[str]) -> AsyncIterator[Ticket]:
+        ticket = await self.acquire(api_key)
+        try:
+            yield ticket
+        finally:
+            await self.release(ticket)
+
+    @asynccontextmanager
+    async def admit_background(self, api_key: Optional[str]) -> AsyncIterator[Ticket]:
+        """Low-priority admission; raises RateLimited at once instead of competing with user requests."""
+        key = self._key_id(api_key)
+        now = time.monotonic()
+        if not self.enabled:
+            self.in_flight += 1
+            ticket = Ticket(key)
+        elif (not self._queue and self.in_flight < self.max_concurrency
+                and self.background_in_flight < self.background_slots
+                and self.bucket.has_spare(now) and self._key_bucket(key).has_spare(now)):
+            ticket = self._grant(key, background=True)
+        else:
+            self.background_deferred += 1
+            raise RateLimited("Upstream busy with user requests; background call deferred.", 1.0)
+        try:
+            yield ticket
+        finally:
+            await self.release(ticket)
+
+    async def _dispatch(self) -> None:
+        """Grant queued requests in FIFO order as slots and bucket tokens allow."""
+        while self._queue:
+            now, wait = time.monotonic(), math.inf
+            for waiter in list(self._queue):
+                if waiter.future.done():
+                    self._queue.remove(waiter)
+                    continue
+                delay = self._wait_time(waiter.key, now)
+                if delay == 0:
+                    self._queue.remove(waiter)
+                    waiter.future.set_result(self._grant(waiter.key))
+                    continue
+                wait = min(wait, delay)
+                if self.in_flight >= self.max_concurrency or self.bucket.wait_time(now) > 0:
+                    break  # a global limit: nobody behind this waiter can go either
+            if not self._queue:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), None if wait == math.inf else wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def observe(self, api_key: Optional[str], status: int, headers: Mapping[str, str]) -> None:
+        """Adapt the key's bucket to an upstream response (429 / ``x-ratelimit-*`` headers)."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        bucket = self._key_bucket(self._key_id(api_key))
+        if status == 429:
+            self.upstream_429 += 1
+            delay = (retry_after_seconds(headers)
+                     or parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                     or parse_duration(headers.get("x-ratelimit-reset-requests"))
+                     or 1.0)
+            bucket.pause(now + delay)
+            logger.warning("Upstream rate limit hit; pausing this API key for %.1f s", delay)
+            return
+        try:
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if remaining_requests is not None and reset_requests:
+                remaining = float(remaining_requests)
+                if remaining <= 0:
+                    bucket.pause(now + reset_requests)
+                    self.header_pauses += 1
+                else:
+                    # spread what is left over the time until it resets
+                    sustainable = remaining / reset_requests
+                    bucket.rate = min(self.key_rate, sustainable) if self.key_rate > 0 else sustainable
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            reset_tokens = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            if remaining_tokens is not None and reset_tokens and float(remaining_tokens) < self.token_reserve:
+                bucket.pause(now + reset_tokens)
+                self.header_pauses += 1
+        except ValueError:
+            logger.debug("Ignoring unparsable x-ratelimit headers: %s", dict(headers))
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_length": len(self._queue),
+            "queue_max": self.queue_max,
+            "queue_timeout_seconds": self.queue_timeout,
+            "rate": self.bucket.rate,
+            "key_rate": self.key_rate,
+            "keys": len(self._keys),
+            "paused_keys": sum(1 for b in self._keys.values() if b.paused_until > now),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "background_in_flight": self.background_in_flight,
+            "background_deferred": self.background_deferred,
+            "upstream_429": self.upstream_429,
+            "header_pauses": self.header_pauses,
+        }
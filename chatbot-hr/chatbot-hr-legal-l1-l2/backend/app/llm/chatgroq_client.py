@@ -1,47 +1,93 @@
 import os
-from typing import List, Dict, Any
-import httpx
-from dotenv import load_dotenv
+import json
+from typing import List, Dict, Any, AsyncIterator, Callable, Mapping, Optional
+from .. import config  # noqa: F401  (loads .env)
+from .admission import RateLimited, retry_after_seconds
+from .http_pool import http_pool
 
-load_dotenv()
+# (api key, status code, response headers), called for every upstream response
+ResponseObserver = Callable[[Optional[str], int, Mapping[str, str]], None]
 
 class ChatGROQClient:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, on_response: Optional[ResponseObserver] = None):
         self.api_key = api_key or os.getenv("CHATGROQ_API_KEY")
         self.base_url = os.getenv("CHATGROQ_BASE_URL", "https://api.groq.com/openai/v1")
+        self.model = os.getenv("CHATGROQ_MODEL", "llama-3.1-8b-instant")
+        self.on_response = on_response
 
-    async def chat(self, system_prompt: str, messages: List[Dict[str, Any]]) -> str:
-        if not self.api_key:
-            return self._mock_reply(system_prompt, messages)
+    def _check(self, resp) -> None:
+        # rate-limit headers go to the observer (admission control) before any error is raised
+        if self.on_response is not None:
+            self.on_response(self.api_key, resp.status_code, resp.headers)
+        if resp.status_code == 429:
+            raise RateLimited("Groq rate limit reached; retry later.", retry_after_seconds(resp.headers) or 1.0)
+        resp.raise_for_status()
 
+    def _build_payload(self, system_prompt: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         # Build OpenAI-compatible messages
         formatted_messages = [{"role": "system", "content": system_prompt}]
         for m in messages:
-            role = m.get("role", "").lower()
+            # accept both {"role", "content"} dicts and compact (role, content) tuples
+            role, content = (m.get("role", ""), m.get("content")) if isinstance(m, dict) else m
+            role = role.lower()
             if role == "user" or role == "assistant":
-                formatted_messages.append({"role": role, "content": m["content"]})
+                formatted_messages.append({"role": role, "content": content})
             else:
                 # Skip invalid roles
                 continue
 
-        payload = {
-            "model": "llama-3.1-8b-instant",  # replace with a valid Groq model
+        return {
+            "model": self.model,
             "messages": formatted_messages,
             "temperature": 0.7
         }
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    async def chat(self, system_prompt: str, messages: List[Dict[str, Any]]) -> str:
+        if not self.api_key:
+            return self._mock_reply(system_prompt, messages)
 
+        payload = self._build_payload(system_prompt, messages)
+
+        # auth headers are set on the pooled client for this api key
         url = f"{self.base_url}/chat/completions"
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
+        async with http_pool.client(self.api_key) as client:
+            resp = await client.post(url, json=payload)
+            self._check(resp)
             data = resp.json()
             return data["choices"][0]["message"]["content"]
 
+    async def stream_chat(self, system_prompt: str, messages: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Yield content deltas as Groq streams them (``stream=true`` SSE)."""
+        if not self.api_key:
+            # mock mode: stream the mock reply word by word so the UI path is exercised
+            words = self._mock_reply(system_prompt, messages).split(" ")
+            for i, word in enumerate(words):
+                yield word if i == 0 else " " + word
+            return
+
+        payload = self._build_payload(system_prompt, messages)
+        payload["stream"] = True
+
+        url = f"{self.base_url}/chat/completions"
+        async with http_pool.client(self.api_key) as client:
+            async with client.stream("POST", url, json=payload) as resp:
+                self._check(resp)
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+
     def _mock_reply(self, system_prompt: str, messages: List[Dict[str, Any]]) -> str:
-        last = messages[-1]["content"] if messages else ""
+        last = ""
+        if messages:
+            last = messages[-1]["content"] if isinstance(messages[-1], dict) else messages[-1][1]
         return f"(mock) I received your message: '{last}'"
@@ -0,0 +1,321 @@
+import os
+import asyncio
+import hashlib
+import logging
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from .admission import RateLimited
+
+Turn = Tuple[str, str]
+# (previous summary, turns to fold in) -> new summary
+Summarizer = Callable[[str, Sequence[Turn]], Awaitable[str]]
+
+# role marker and separators the chat template adds around every message
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a support conversation. Merge the new turns into the "
+    "current summary. Keep facts, names, dates, numbers, decisions and open questions; drop "
+    "greetings and filler. Reply with the updated summary only, in at most {words} words."
+)
+
+
+class TokenCounter:
+    """Counts tokens with the tokenizer closest to the upstream model.
+
+    CONTEXT_TOKENIZER names a Hugging Face tokenizer (e.g. the Llama repo
+    behind CHATGROQ_MODEL) for exact counts; otherwise tiktoken's encoding for
+    the model, or cl100k_base, approximates it. Without either package it
+    falls back to ~4 characters per token. ``load`` may download the
+    tokenizer, so the app calls it from a thread at startup; until it is
+    done, counts use the ~4 characters per token estimate.
+    """
+
+    def __init__(self, model: str, tokenizer: Optional[str] = None, cache_size: int = 4096):
+        self.model = model
+        self.tokenizer = tokenizer if tokenizer is not None else os.getenv("CONTEXT_TOKENIZER", "")
+        self.kind: Optional[str] = None
+        self._encode: Optional[Callable[[str], int]] = None
+        self._exact = functools.lru_cache(maxsize=cache_size)(self._count)
+
+    def load(self) -> str:
+        if self._encode is not None:
+            return self.kind
+        if self.tokenizer:
+            try:
+                from transformers import AutoTokenizer
+
+                hf = AutoTokenizer.from_pretrained(self.tokenizer)
+                self._encode = lambda text: len(hf.encode(text, add_special_tokens=False))
+                self.kind = f"hf:{self.tokenizer}"
+                return self.kind
+            except Exception as e:
+                logging.warning(f"Tokenizer {self.tokenizer} unavailable ({e}); trying tiktoken")
+        try:
+            import tiktoken
+
+            try:
+                encoding = tiktoken.encoding_for_model(self.model.split("/")[-1])
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            self._encode = lambda text: len(encoding.encode(text, disallowed_special=()))
+            self.kind = f"tiktoken:{encoding.name}"
+        except ImportError:
+            self._encode = lambda text: len(text) // 4 + 1
+            self.kind = "chars/4"
+        return self.kind
+
+    def _count(self, text: str) -> int:
+        return self._encode(text)
+
+    def count(self, text: str) -> int:
+        if self._encode is None:
+            return len(text) // 4 + 1
+        return self._exact(text)
+
+    def truncate(self, text: str, max_tokens: int, keep_end: bool = False) -> str:
+        """Shorten ``text`` to about ``max_tokens`` (cut proportionally, then re-counted)."""
+        for _ in range(3):
+            tokens = self.count(text)
+            if tokens <= max_tokens:
+                return text
+            keep = max(0, int(len(text) * max_tokens / tokens) - 1)
+            text = text[-keep:] if keep_end else text[:keep]
+        return text
+
+
+def _turn_hash(turn: Turn) -> str:
+    return hashlib.sha256(turn[0].encode("utf-8") + b"\0" + turn[1].encode("utf-8")).hexdigest()
+
+
+def _extract(role: str, content: str, max_chars: int = 200) -> str:
+    # first sentence (or line) of a turn, as the cheap stand-in for a summary
+    text = " ".join(content.split())
+    for end in (". ", "? ", "! "):
+        cut = text.find(end)
+        if 0 < cut < max_chars:
+            text = text[:cut + 1]
+            break
+    if len(text) > max_chars:
+        text = text[:max_chars].rstrip() + "…"
+    return f"{role}: {text}"
+
+
+# how many of the last folded turns identify where a session's summary ends
+TAIL_TURNS = 3
+
+
+@dataclass
+class BuiltContext:
+    system_prompt: str
+    messages: List[Turn]
+    summary: str  # folded older turns ("" when everything fits); already part of system_prompt
+    summarized_turns: int  # turns of this history represented only by the summary
+    tokens: int
+
+
+class _Rolling:
+    """A session's running summary and the hashes of the last turns folded into it."""
+
+    __slots__ = ("summary", "tail")
+
+    def __init__(self):
+        self.summary = ""
+        self.tail: List[str] = []
+
+
+class ContextBuilder:
+    """Fits the conversation into CONTEXT_MAX_TOKENS, newest turns first.
+
+    The system prompt and the newest turns that fit the budget are sent
+    verbatim (the latest turn always is). Older turns are represented by a
+    running summary per session, appended to the system prompt. The summary
+    is extended, never rebuilt. Its end is found again by the hashes of the
+    last turns folded into it, so it stays valid when the session store drops
+    old turns. ``retire`` folds turns the store is about to drop, so they are
+    not lost. The LLM refreshes summaries in the background (every
+    CONTEXT_SUMMARY_REFRESH_TURNS newly folded turns), never on the request
+    path. Folded turns it has not caught up with yet are represented by their
+    first sentence. Per-request work and payload therefore stay bounded by
+    the budget however long the conversation gets.
+    """
+
+    def __init__(self, model: str, summarizer: Optional[Summarizer] = None):
+        self.max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))
+        self.summary_tokens = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "400"))
+        self.refresh_turns = int(os.getenv("CONTEXT_SUMMARY_REFRESH_TURNS", "6"))
+        self.summary_input_tokens = int(os.getenv("CONTEXT_SUMMARY_INPUT_TOKENS", "3000"))
+        self.max_sessions = int(os.getenv("CONTEXT_SUMMARY_CACHE_MAX", "2048"))
+        use_llm = os.getenv("CONTEXT_SUMMARY_MODE", "llm") == "llm"
+        self.summarizer = summarizer if use_llm else None
+        self.counter = TokenCounter(model)
+        self._sessions: "OrderedDict[str, _Rolling]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.builds = 0
+        self.trimmed = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.refresh_deferred = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_tokens > 0
+
+    def _tokens(self, turn: Turn) -> int:
+        return self.counter.count(turn[1]) + MESSAGE_OVERHEAD
+
+    def _state(self, sid: Optional[str], create: bool = False) -> Optional[_Rolling]:
+        if not sid:
+            return None
+        state = self._sessions.get(sid)
+        if state is None and create:
+            state = self._sessions[sid] = _Rolling()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if state is not None:
+            self._sessions.move_to_end(sid)
+        return state
+
+    @staticmethod
+    def _covered(state: Optional[_Rolling], turns: Sequence[Turn]) -> int:
+        """How many leading turns of ``turns`` the summary already covers.
+
+        0 if there is no summary, or if its last folded turns are no longer in
+        the history: the store dropped them, so every turn left is newer.
+        """
+        if state is None or not state.tail:
+            return 0
+        tail = state.tail
+        hashes = [_turn_hash(t) for t in turns]
+        for end in range(len(hashes), 0, -1):
+            n = min(len(tail), end)
+            if hashes[end - n:end] == tail[-n:]:
+                return end
+        return 0
+
+    def _fit(self, turns: Sequence[Turn], budget: int) -> Tuple[int, int]:
+        kept, used = 0, 0
+        for turn in reversed(turns):
+            tokens = self._tokens(turn)
+            if kept and used + tokens > budget:
+                break
+            kept, used = kept + 1, used + tokens
+        return kept, used
+
+    def _append_extract(self, summary: str, turns: Sequence[Turn]) -> str:
+        # cheap stand-in for an LLM summary; the newest lines win when space runs out
+        lines = [_extract(role, content) for role, content in turns]
+        return self.counter.truncate("\n".join(([summary] if summary else []) + lines), self.summary_tokens, keep_end=True)
+
+    def build(self, system_prompt: str, turns: Sequence[Turn], sid: Optional[str] = None) -> BuiltContext:
+        """``sid`` keeps a rolling summary for the session; without it folded turns are only extracted."""
+        self.builds += 1
+        if not self.enabled or not turns:
+            return BuiltContext(system_prompt, list(turns), "", 0, 0)
+
+        state = self._state(sid)
+        system_tokens = self.counter.count(system_prompt)
+        kept, used = self._fit(turns, self.max_tokens - system_tokens)
+        if kept == len(turns) and (state is None or not state.summary):
+            return BuiltContext(system_prompt, list(turns), "", 0, system_tokens + used)
+        kept, used = self._fit(turns, self.max_tokens - system_tokens - self.summary_tokens)
+        cut = len(turns) - kept
+        if cut:
+            self.trimmed += 1
+
+        covered = min(self._covered(state, turns), cut)
+        gap = turns[covered:cut]
+        summary = state.summary if state is not None else ""
+        if gap and self.summarizer is not None and sid and len(gap) >= min(self.refresh_turns, cut):
+            self._schedule_refresh(sid, turns[:cut])
+
+        # folded turns the summary does not cover yet: newest first, as many as fit
+        room = self.summary_tokens - (self.counter.count(summary) if summary else 0)
+        lines: List[str] = []
+        for role, content in reversed(gap):
+            line = _extract(role, content)
+            room -= self.counter.count(line) + 1
+            if room < 0:
+                break
+            lines.append(line)
+        text = self.counter.truncate("\n".join(([summary] if summary else []) + lines[::-1]),
+                                     self.summary_tokens, keep_end=True)
+        prompt = f"{system_prompt}\n\nSummary of the earlier conversation (those turns are not repeated below):\n{text}"
+        return BuiltContext(prompt, list(turns[cut:]), text, cut, self.counter.count(prompt) + used)
+
+    def retire(self, sid: str, turns: Sequence[Turn], dropped: int) -> None:
+        """The session store is about to drop ``turns[:dropped]``; fold whatever the summary lacks."""
+        if not self.enabled or not sid or dropped <= 0:
+            return
+        state = self._state(sid, create=True)
+        covered = self._covered(state, turns)
+        if covered >= dropped:
+            return
+        # extracted now, because the turns are gone by the next request; a later LLM
+        # refresh folds these lines into a proper summary along with the next turns
+        state.summary = self._append_extract(state.summary, turns[covered:dropped])
+        state.tail = [_turn_hash(t) for t in turns[max(0, dropped - TAIL_TURNS):dropped]]
+
+    def _schedule_refresh(self, sid: str, older: Sequence[Turn]) -> None:
+        if sid in self._refreshing:
+            return
+        self._refreshing.add(sid)
+        task = asyncio.get_running_loop().create_task(self._refresh(sid, list(older)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._refreshing.discard(sid))
+
+    async def _refresh(self, sid: str, older: List[Turn]) -> None:
+        """Extend the session's summary with ``older`` turns it does not cover, one chunk per LLM call."""
+        state = self._state(sid, create=True)
+        covered = self._covered(state, older)
+        while covered < len(older):
+            end, size = covered, 0
+            while end < len(older) and (end == covered or size + self._tokens(older[end]) <= self.summary_input_tokens):
+                size += self._tokens(older[end])
+                end += 1
+            chunk = [(role, self.counter.truncate(content, self.summary_input_tokens)) for role, content in older[covered:end]]
+            tail = state.tail
+            try:
+                summary = await self.summarizer(state.summary, chunk)
+            except RateLimited:
+                # upstream busy with user traffic; the next request reschedules it
+                self.refresh_deferred += 1
+                return
+            except Exception as e:
+                self.refresh_failures += 1
+                logging.warning(f"Conversation summary refresh failed: {e}")
+                return
+            if state.tail is not tail or self._sessions.get(sid) is not state:
+                return  # retire() or eviction changed the summary meanwhile; keep theirs
+            state.summary = self.counter.truncate(summary.strip(), self.summary_tokens)
+            state.tail = [_turn_hash(t) for t in older[max(0, end - TAIL_TURNS):end]]
+            covered = end
+            self.refreshes += 1
+
+    def summary_prompt(self) -> str:
+        # ~0.75 words per token
+        return SUMMARY_PROMPT.format(words=int(self.summary_tokens * 0.75))
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_tokens": self.max_tokens,
+            "tokenizer": self.counter.kind,
+            "summaries": "llm" if self.summarizer is not None else "extractive",
+            "builds": self.builds,
+            "trimmed": self.trimmed,
+            "sessions": len(self._sessions),
+            "refreshing": len(self._refreshing),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refresh_deferred": self.refresh_deferred,
+        }
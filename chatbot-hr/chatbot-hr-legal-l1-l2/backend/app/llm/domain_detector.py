@@ -0,0 +1,103 @@
+import os
+import re
+import json
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# keyword tables per domain; order matters for tie-breaks (earlier wins)
+DEFAULT_KEYWORDS: Dict[str, List[str]] = {
+    "hr": ["salary", "benefit", "hr", "leave", "hiring", "payroll", "holiday", "vacation", "onboarding"],
+    "legal": ["contract", "policy", "compliance", "nda", "legal", "agreement", "liability"],
+    "l1": ["ticket", "issue", "bug", "incident", "password", "login"],
+}
+DEFAULT_DOMAIN = "l2"
+
+
+def _forms(word: str) -> List[str]:
+    """The keyword and its simple English plurals (policy -> policies, tax -> taxes)."""
+    if len(word) > 1 and word.endswith("y") and word[-2] not in "aeiou":
+        return [word, word[:-1] + "ies"]
+    return [word, word + "s", word + "es"]
+
+
+class DomainDetector:
+    """Keyword-based domain detection with one precompiled word-boundary regex.
+
+    Scores are accumulated per session, so each turn only scans the new
+    messages. ``resolve`` leaves the session cache alone; ``commit`` the
+    returned scores once the turn is stored, so a failed request does not
+    count towards the session's domain. Keyword tables can be overridden with a JSON file named by
+    DOMAIN_KEYWORDS_FILE (``{"hr": ["salary", ...], ...}``).
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, List[str]]] = None, default: str = DEFAULT_DOMAIN,
+                 max_sessions: Optional[int] = None):
+        if keywords is None:
+            path = os.getenv("DOMAIN_KEYWORDS_FILE")
+            if path:
+                with open(path, encoding="utf-8") as f:
+                    keywords = json.load(f)
+            else:
+                keywords = DEFAULT_KEYWORDS
+        self.default = default
+        self.domains = list(keywords)
+        # every accepted form (keyword or plural) -> domain
+        self._lookup: Dict[str, str] = {}
+        for domain, words in keywords.items():
+            for w in words:
+                for form in _forms(w.lower()):
+                    self._lookup.setdefault(form, domain)
+        # longest first so multi-word keywords win over their prefixes
+        alternation = "|".join(re.escape(w) for w in sorted(self._lookup, key=len, reverse=True))
+        self._pattern = re.compile(rf"\b({alternation})\b", re.IGNORECASE)
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+        self._cache: "OrderedDict[str, Tuple[str, Counter]]" = OrderedDict()
+
+    def score(self, texts: Iterable[str]) -> Counter:
+        scores: Counter = Counter()
+        for text in texts:
+            for match in self._pattern.finditer(text):
+                scores[self._lookup[match.group(1).lower()]] += 1
+        return scores
+
+    def _pick(self, scores: Counter) -> str:
+        best, best_score = self.default, 0
+        for domain in self.domains:
+            if scores[domain] > best_score:
+                best, best_score = domain, scores[domain]
+        return best
+
+    def resolve(self, new_texts: Iterable[str], session_id: Optional[str] = None,
+                history: Iterable[str] = ()) -> Tuple[str, Counter]:
+        """Return (domain, session scores) for a turn, scoring only ``new_texts``.
+
+        ``history`` is scanned once when the session is not cached yet (e.g. a
+        session created by another worker). The cache is not updated.
+        """
+        cached = self._cache.get(session_id) if session_id is not None else None
+        if cached is None:
+            scores = self.score(history) if session_id is not None else Counter()
+        else:
+            scores = Counter(cached[1])
+            self._cache.move_to_end(session_id)
+        scores.update(self.score(new_texts))
+        return self._pick(scores), scores
+
+    def commit(self, session_id: str, scores: Counter) -> None:
+        """Remember the scores ``resolve`` returned for a turn that was stored."""
+        self._cache[session_id] = (self._pick(scores), scores)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_sessions:
+            self._cache.popitem(last=False)
+
+    def detect(self, new_texts: Iterable[str], session_id: Optional[str] = None,
+               history: Iterable[str] = ()) -> str:
+        """``resolve`` and ``commit`` in one step, for callers with nothing to roll back."""
+        domain, scores = self.resolve(new_texts, session_id, history)
+        if session_id is not None:
+            self.commit(session_id, scores)
+        return domain
+
+    def cached(self, session_id: str) -> Optional[Tuple[str, Dict[str, int]]]:
+        entry = self._cache.get(session_id)
+        return (entry[0], dict(entry[1])) if entry else None
@@ -0,0 +1,130 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import httpx
+from .. import config  # noqa: F401  (loads .env before the settings below are read)
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _PooledClient:
+    """An AsyncClient plus a lease count so eviction never closes a client mid-request."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.leases = 0
+        self.evicted = False
+
+
+class HTTPClientPool:
+    """App-lifetime pool of keep-alive httpx clients, one per API key.
+
+    Clients are kept in LRU order and capped at ``max_clients``. An evicted
+    client is closed once its last in-flight request releases it.
+    """
+
+    def __init__(self):
+        self.timeout = float(os.getenv("CHATGROQ_TIMEOUT", "60"))
+        self.max_clients = _env_int("CHATGROQ_MAX_CLIENTS", 16)
+        self.limits = httpx.Limits(
+            max_connections=_env_int("CHATGROQ_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("CHATGROQ_MAX_KEEPALIVE", 20),
+            keepalive_expiry=float(os.getenv("CHATGROQ_KEEPALIVE_EXPIRY", "30")),
+        )
+        self.http2 = os.getenv("CHATGROQ_HTTP2", "1") == "1"
+        if self.http2 and not _http2_available():
+            logger.warning("CHATGROQ_HTTP2 enabled but 'h2' is not installed; falling back to HTTP/1.1")
+            self.http2 = False
+        self._clients: "OrderedDict[str, _PooledClient]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = set()
+
+    def _new_client(self, api_key: str) -> httpx.AsyncClient:
+        headers: Dict[str, str] = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=self.limits,
+            http2=self.http2,
+            headers=headers,
+        )
+
+    async def startup(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def shutdown(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for pooled in clients:
+            await pooled.client.aclose()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        self._loop = None
+
+    def _acquire(self, api_key: str) -> _PooledClient:
+        pooled = self._clients.get(api_key)
+        if pooled is not None:
+            self._clients.move_to_end(api_key)
+        else:
+            pooled = _PooledClient(self._new_client(api_key))
+            self._clients[api_key] = pooled
+            while len(self._clients) > self.max_clients:
+                _, old = self._clients.popitem(last=False)
+                old.evicted = True
+                if old.leases == 0:
+                    self._close_later(old)
+        pooled.leases += 1
+        return pooled
+
+    def _release(self, pooled: _PooledClient) -> None:
+        pooled.leases -= 1
+        if pooled.evicted and pooled.leases == 0:
+            self._close_later(pooled)
+
+    def _close_later(self, pooled: _PooledClient) -> None:
+        task = asyncio.get_running_loop().create_task(pooled.client.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @asynccontextmanager
+    async def client(self, api_key: str) -> AsyncIterator[httpx.AsyncClient]:
+        """Lease the pooled client for ``api_key``.
+
+        Outside the app's event loop (scripts, worker threads) a short-lived
+        client is used instead, since httpx clients are bound to one loop.
+        """
+        if self._loop is None:
+            await self.startup()
+        if asyncio.get_running_loop() is not self._loop:
+            async with self._new_client(api_key) as one_off:
+                yield one_off
+            return
+
+        pooled = self._acquire(api_key or "")
+        try:
+            yield pooled.client
+        finally:
+            self._release(pooled)
+
+
+# Shared pool, opened/closed by the FastAPI startup/shutdown hooks in main.py
+http_pool = HTTPClientPool()
@@ -1,39 +1,54 @@
-from typing import List, Optional, Mapping, Any
+from typing import List, Optional, Mapping, Any, Callable
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from langchain.llms.base import LLM
-from pydantic import BaseModel
 from .chatgroq_client import ChatGROQClient
 
+# bounded pool for LLMs that only implement the sync `_call`, so they never run on the event loop
+sync_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LANGCHAIN_SYNC_WORKERS", "4")),
+    thread_name_prefix="langchain-sync",
+)
+
 
 class ChatGROQLangChain(LLM):
     """A minimal LangChain-compatible wrapper around the existing ChatGROQ client.
 
-    This implements the synchronous `__call__` and `generate` shape expected by
-    some LangChain components. It delegates to ChatGROQClient which is async, so
-    this wrapper will call it via an async loop when needed.
+    `_acall` awaits ChatGROQClient natively (sharing the pooled HTTP client),
+    so async callers should use `apredict`/`agenerate`. The synchronous
+    `_call` runs the client on a private event loop and must not be called
+    from a thread that is already running one.
     """
 
     api_key: Optional[str] = None
     model: str = "llama-3.1-8b-instant"
+    # passed to ChatGROQClient: sees every upstream status and rate-limit headers
+    on_response: Optional[Callable[..., None]] = None
 
     class Config:
         arbitrary_types_allowed = True
 
     def _get_client(self) -> ChatGROQClient:
-        return ChatGROQClient(api_key=self.api_key)
-
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        # LangChain expects a synchronous call for simple LLMs.
-        # We'll craft a minimal message list and run the async client using
-        # anyio.to_thread or asyncio.run for a quick implementation.
-        import asyncio
+        return ChatGROQClient(api_key=self.api_key, on_response=self.on_response)
 
-        async def _async_chat():
-            client = self._get_client()
-            messages = [{"role": "user", "content": prompt}]
-            return await client.chat(system_prompt="", messages=messages)
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                     **kwargs: Any) -> str:
+        client = self._get_client()
+        messages = [{"role": "user", "content": prompt}]
+        return await client.chat(system_prompt="", messages=messages)
 
-        return asyncio.get_event_loop().run_until_complete(_async_chat())
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+              **kwargs: Any) -> str:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # no loop in this thread (script or sync_executor worker): run one for this call
+            return asyncio.run(self._acall(prompt, stop=stop))
+        raise RuntimeError(
+            "ChatGROQLangChain._call would block the running event loop; "
+            "use `await llm.apredict(...)` or run it in `sync_executor`"
+        )
 
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
@@ -44,6 +59,19 @@ class ChatGROQLangChain(LLM):
         return "chatgroq"
 
 
+def has_native_async(llm: LLM) -> bool:
+    """True when ``llm`` overrides `_acall` instead of inheriting LangChain's executor fallback."""
+    return type(llm)._acall is not LLM._acall
+
+
+async def apredict(llm: LLM, prompt: str) -> str:
+    """Await ``llm`` natively when possible, otherwise offload its sync path to `sync_executor`."""
+    if has_native_async(llm):
+        return await llm.apredict(prompt)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sync_executor, llm.predict, prompt)
+
+
 # Small test helper if executed directly
 if __name__ == "__main__":
     import dotenv
@@ -0,0 +1,77 @@
+import os
+import re
+import time
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+_WS = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    # case, whitespace and trailing punctuation do not change the question
+    return _WS.sub(" ", text).strip().lower().rstrip("?!. ")
+
+
+class ResponseCache:
+    """TTL + LRU cache of LLM replies, keyed on the effective prompt.
+
+    The key covers domain, system prompt, model and the normalized last
+    ``last_n`` messages. Domains listed in RESPONSE_CACHE_DISABLED_DOMAINS
+    (comma separated) are never cached.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 last_n: Optional[int] = None, disabled_domains: Optional[Sequence[str]] = None):
+        self.enabled = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+        # explicit zeros are honoured: max_entries=0 turns the cache off
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+        self.last_n = last_n or int(os.getenv("RESPONSE_CACHE_LAST_N", "3"))
+        if disabled_domains is None:
+            disabled_domains = [d for d in os.getenv("RESPONSE_CACHE_DISABLED_DOMAINS", "").split(",") if d.strip()]
+        self.disabled_domains = {d.strip().lower() for d in disabled_domains}
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def enabled_for(self, domain: str) -> bool:
+        return self.enabled and self.max_entries > 0 and domain.lower() not in self.disabled_domains
+
+    def make_key(self, domain: str, system_prompt: str, model: str, messages: Sequence[Tuple[str, str]]) -> str:
+        tail = [(role, _normalize(content)) for role, content in messages[-self.last_n:]]
+        raw = json.dumps([domain, system_prompt, model, tail], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, reply: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+            "evictions": self.evictions,
+            "disabled_domains": sorted(self.disabled_domains),
+        }
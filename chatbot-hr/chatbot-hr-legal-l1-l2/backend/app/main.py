@@ -1,14 +1,23 @@
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import chat, files
-from dotenv import load_dotenv
+from . import config  # noqa: F401  (loads .env once, before the routers read settings)
+from .routers import chat, download, files
+from .llm.http_pool import http_pool
+from .rag.jobs import ingestion_queue
+from .storage import close_storage
+import asyncio
+import logging
 import os
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Debug prints to confirm environment is loaded
-print("Loaded API key:", os.getenv("CHATGROQ_API_KEY"))
-print("Azure Storage Connection:", bool(os.getenv("AZURE_STORAGE_CONNECTION_STRING")))
+# never log the key itself
+logger.info("ChatGROQ API key configured: %s", bool(os.getenv("CHATGROQ_API_KEY")))
+logger.info("Azure Storage connection configured: %s", bool(os.getenv("AZURE_STORAGE_CONNECTION_STRING")))
 
 app = FastAPI(title="Chatbot API")
 
@@ -21,9 +30,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def report_startup_time():
+    logger.info("App imported and started in %.0f ms", (time.perf_counter() - _import_started) * 1000)
+
+
+@app.on_event("startup")
+async def warm_langchain():
+    # storage and LangChain are created on first use; only LangChain is worth warming, and
+    # that happens in a thread so it never delays startup or blocks the event loop
+    if os.getenv("USE_LANGCHAIN") == "1":
+        asyncio.get_running_loop().run_in_executor(None, chat.langchain_wrapper)
+
+
+@app.on_event("startup")
+async def warm_context_tokenizer():
+    # loading a tokenizer takes a moment; do it in a thread rather than on the first /chat
+    asyncio.get_running_loop().run_in_executor(None, chat.context_builder.counter.load)
+
+
+@app.on_event("shutdown")
+async def stop_context_summaries():
+    await chat.context_builder.close()
+
+
+@app.on_event("startup")
+async def open_http_pool():
+    await http_pool.startup()
+
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    await http_pool.shutdown()
+
+
+@app.on_event("startup")
+async def start_ingestion():
+    await ingestion_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_ingestion():
+    await ingestion_queue.stop()
+
+
+@app.on_event("shutdown")
+async def close_storage_backend():
+    await close_storage()
+
+
+@app.on_event("shutdown")
+async def close_sessions():
+    await chat.conversations.close()
+
 # Include routers
 app.include_router(chat.router, prefix="/api")
 app.include_router(files.router, prefix="/api/files")
+# after files: its /{container}/{name:path} route would shadow the fixed paths above
+app.include_router(download.router, prefix="/api/files")
 
 @app.get("/health")
 async def health():
@@ -0,0 +1,50 @@
+import re
+from typing import List
+
+_HEADING = re.compile(r"^#{1,6}\s")
+
+
+def chunk_markdown(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
+    """Split Docling markdown into retrieval chunks.
+
+    Paragraphs are packed up to ``max_chars``; a new heading always starts a
+    new chunk and is repeated as context for its continuation chunks.
+    Paragraphs longer than ``max_chars`` are split with ``overlap`` chars.
+    """
+    chunks: List[str] = []
+    heading = ""
+    current: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        body = "\n\n".join(current).strip()
+        if body:
+            chunks.append(body)
+        current, size = [], 0
+
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if _HEADING.match(para):
+            flush()
+            heading = para.splitlines()[0]
+        if len(para) > max_chars:
+            if current == [heading]:
+                current, size = [], 0
+            flush()
+            step = max(max_chars - overlap, 1)
+            for start in range(0, len(para), step):
+                piece = para[start:start + max_chars]
+                chunks.append(f"{heading}\n\n{piece}" if heading and not piece.startswith(heading) else piece)
+            continue
+        # never emit a heading on its own; let it ride with its first paragraph
+        if size + len(para) > max_chars and current and current != [heading]:
+            flush()
+            if heading and not para.startswith(heading):
+                current, size = [heading], len(heading)
+        current.append(para)
+        size += len(para) + 2
+    flush()
+    return chunks
@@ -0,0 +1,75 @@
+import os
+import re
+import zlib
+import logging
+import threading
+from typing import List
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Dependency-free fallback: L2-normalized hashed bag of words and bigrams.
+
+    Only used when sentence-transformers is not installed; good enough for
+    keyword-heavy policy questions, not a substitute for a real model.
+    """
+
+    name = "hashing"
+    # bump when the features or hashing change: vectors from another version do not match
+    version = "1"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN.findall(text.lower())
+            for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class SentenceTransformerEmbedder:
+    """CPU sentence-transformers model, loaded once per process."""
+
+    def __init__(self, model_name: str):
+        import sentence_transformers
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.version = sentence_transformers.__version__
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+_embedder = None
+_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the process-wide embedder (RAG_EMBED_MODEL, falling back to hashing)."""
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                model_name = os.getenv("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+                try:
+                    _embedder = SentenceTransformerEmbedder(model_name)
+                except ImportError:
+                    logger.warning("sentence-transformers not installed; using hashing embedder for RAG")
+                    _embedder = HashingEmbedder()
+    return _embedder
@@ -0,0 +1,173 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class EmbedderMismatchError(ValueError):
+    """The index was built with a different embedder (or version) than the one in use."""
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on ``path`` shared by every process (uvicorn workers, the ingest CLI)."""
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        fcntl = None
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            import msvcrt
+            import time
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class VectorIndex:
+    """Append-only vector index for one domain, stored under ``root/<domain>/``.
+
+    ``vectors.f32`` holds raw float32 rows and is read through ``np.memmap``,
+    so searching does not load the index into the heap. ``chunks.jsonl`` holds
+    one JSON record per row; ``meta.json`` records the row count, dim and the
+    embedder (name and version) that produced the vectors, and is replaced
+    atomically after each append, so readers never see partial rows. Appends
+    hold an exclusive ``.lock`` file lock, so several processes can ingest into
+    the same index. Opening or appending with a different embedder raises
+    ``EmbedderMismatchError``: two 384-dim models still produce incomparable
+    vectors.
+    """
+
+    def __init__(self, root: str, domain: str):
+        self.dir = os.path.join(root, domain)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.chunks_path = os.path.join(self.dir, "chunks.jsonl")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.lock_path = os.path.join(self.dir, ".lock")
+        self._lock = threading.Lock()
+        self._meta_mtime: Optional[float] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._offsets: List[int] = []
+        self.count = 0
+        self.dim = 0
+        self.embedder: Optional[Dict[str, str]] = None
+
+    def _read_meta(self) -> Dict[str, Any]:
+        with open(self.meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _refresh(self) -> None:
+        # reopen the memmap only when another writer (or this one) changed meta.json
+        try:
+            mtime = os.stat(self.meta_path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        meta = self._read_meta()
+        self.count, self.dim = meta["count"], meta["dim"]
+        self.embedder = meta.get("embedder")
+        self._vectors = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            if self.count else None
+        )
+        offsets, pos = [], 0
+        with open(self.chunks_path, "rb") as f:
+            for line in f:
+                if len(offsets) == self.count:
+                    break
+                offsets.append(pos)
+                pos += len(line)
+        self._offsets = offsets
+        self._meta_mtime = mtime
+
+    def _check_embedder(self, embedder: Any) -> None:
+        if not self.count:
+            return
+        expected = {"name": embedder.name, "version": embedder.version}
+        if self.embedder != expected:
+            raise EmbedderMismatchError(
+                f"index {self.dir} was built with {self.embedder or 'an unrecorded embedder'}, "
+                f"not {expected}; rebuild it with the current embedder"
+            )
+
+    def add(self, vectors: np.ndarray, chunks: List[Dict[str, Any]], embedder: Any) -> None:
+        """Append ``vectors`` (n x dim, L2-normalized, made by ``embedder``) with one metadata dict per row."""
+        if len(vectors) != len(chunks):
+            raise ValueError("vectors and chunks must have the same length")
+        if not len(chunks):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        os.makedirs(self.dir, exist_ok=True)
+        with self._lock, _file_lock(self.lock_path):
+            # another process may have appended since our last look (same-second mtimes included)
+            self._meta_mtime = None
+            self._refresh()
+            self._check_embedder(embedder)
+            if self.dim and vectors.shape[1] != self.dim:
+                raise ValueError(f"index dim is {self.dim}, got {vectors.shape[1]}")
+            # truncate rows left behind by an interrupted append before writing
+            chunks_end = self._chunks_size()
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(self.count * vectors.shape[1] * 4)
+                f.write(vectors.tobytes())
+            with open(self.chunks_path, "ab") as f:
+                f.truncate(chunks_end)
+                for chunk in chunks:
+                    f.write(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+            tmp = f"{self.meta_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "count": self.count + len(chunks),
+                    "dim": vectors.shape[1],
+                    "embedder": {"name": embedder.name, "version": embedder.version},
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.meta_path)
+            self._meta_mtime = None
+            self._refresh()
+
+    def _chunks_size(self) -> int:
+        if not self._offsets:
+            return 0
+        with open(self.chunks_path, "rb") as f:
+            f.seek(self._offsets[-1])
+            return self._offsets[-1] + len(f.readline())
+
+    def _chunk(self, row: int) -> Dict[str, Any]:
+        with open(self.chunks_path, "rb") as f:
+            f.seek(self._offsets[row])
+            return json.loads(f.readline())
+
+    def search(self, query: np.ndarray, k: int = 4, embedder: Any = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return the ``k`` best (cosine score, chunk) pairs for an L2-normalized query made by ``embedder``."""
+        with self._lock:
+            self._refresh()
+            if embedder is not None:
+                self._check_embedder(embedder)
+            vectors = self._vectors
+            if vectors is None or k <= 0:
+                return []
+            scores = vectors @ np.asarray(query, dtype=np.float32)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), self._chunk(int(i))) for i in top]
@@ -0,0 +1,65 @@
+"""Convert documents with Docling and add them to a domain's vector index.
+
+Usage (from backend/):
+
+    python -m app.rag.ingest --domain hr ../../../Leave-and-Holiday-Policy.pdf
+"""
+import os
+import argparse
+from typing import Any, Dict, Optional
+from .chunking import chunk_markdown
+from .embedder import get_embedder
+from .index import VectorIndex
+
+_converter = None
+
+
+def convert_to_markdown(source: str) -> str:
+    """Convert a path or URL to markdown with Docling's DocumentConverter (as in demo-doclk/docs.py)."""
+    global _converter
+    if _converter is None:
+        # heavy import (layout models); only paid by processes that actually ingest
+        from docling.document_converter import DocumentConverter
+
+        _converter = DocumentConverter()
+    return _converter.convert(source).document.export_to_markdown()
+
+
+def ingest_markdown(index: VectorIndex, markdown: str, source: str,
+                    extra: Optional[Dict[str, Any]] = None) -> int:
+    """Chunk, embed and append ``markdown`` to ``index``. Returns the number of chunks added."""
+    texts = chunk_markdown(markdown)
+    if not texts:
+        return 0
+    embedder = get_embedder()
+    vectors = embedder.embed(texts)
+    chunks = [{"source": source, "chunk": i, "text": t, **(extra or {})} for i, t in enumerate(texts)]
+    index.add(vectors, chunks, embedder)
+    return len(chunks)
+
+
+def ingest_file(index: VectorIndex, path: str, source: Optional[str] = None,
+                extra: Optional[Dict[str, Any]] = None) -> int:
+    if path.lower().endswith((".md", ".txt")):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            markdown = f.read()
+    else:
+        markdown = convert_to_markdown(path)
+    return ingest_markdown(index, markdown, source or os.path.basename(path), extra)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Add documents to a domain's RAG index")
+    parser.add_argument("--domain", required=True, help="hr, legal, l1 or l2")
+    parser.add_argument("--index-dir", default=os.getenv("RAG_INDEX_DIR", "rag_index"))
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    index = VectorIndex(args.index_dir, args.domain)
+    for path in args.paths:
+        added = ingest_file(index, path)
+        print(f"{path}: {added} chunks")
+
+
+if __name__ == "__main__":
+    main()
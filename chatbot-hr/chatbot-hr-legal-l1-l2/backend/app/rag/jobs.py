@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from .index import VectorIndex
+from .ingest import ingest_file
+
+logger = logging.getLogger(__name__)
+
+
+def make_job_id(domain: str, sha256: str) -> str:
+    """Jobs are per (domain, content): the same file uploaded to two domains is indexed in both."""
+    return f"{domain}-{sha256}"
+
+
+class IngestJob:
+    """One document to convert and index into ``domain``'s index."""
+
+    def __init__(self, job_id: str, path: str, filename: str, domain: str, extra: Dict[str, Any]):
+        self.id = job_id
+        self.path = path
+        self.filename = filename
+        self.domain = domain
+        self.extra = extra
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.metadata: Dict[str, Any] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "domain": self.domain,
+            "error": self.error,
+            "metadata": self.metadata,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.extra,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IngestJob":
+        data = dict(data)
+        job = cls(data.pop("job_id"), "", data.pop("filename"), data.pop("domain"), {})
+        for key in ("status", "error", "metadata", "created_at", "started_at", "finished_at"):
+            setattr(job, key, data.pop(key))
+        job.extra = data
+        return job
+
+
+class IngestionQueue:
+    """Background conversion/indexing of uploaded files with bounded concurrency.
+
+    Uploads spool their bytes to INGEST_SPOOL_DIR and call ``submit``; a fixed
+    number of worker tasks run the CPU-heavy conversion in a dedicated thread
+    pool. Jobs are keyed by (domain, content hash), so re-uploading an
+    unchanged file to the same domain while it is queued, running or done is
+    a no-op.
+
+    Every status change is also written to ``RAG_INDEX_DIR/_jobs/{job_id}.json``,
+    so any uvicorn worker (or a restarted one) can answer ``get`` and finished
+    jobs are not ingested again. Queued and running jobs belong to the worker
+    that accepted the upload; one that dies takes them with it (they stay
+    ``queued``/``running`` on disk and the content can be uploaded again).
+    """
+
+    def __init__(self, spool_dir: Optional[str] = None, index_dir: Optional[str] = None,
+                 concurrency: Optional[int] = None, max_jobs: Optional[int] = None):
+        self.enabled = os.getenv("INGEST_ENABLED", "1") == "1"
+        self.spool_dir = spool_dir or os.getenv("INGEST_SPOOL_DIR", "ingest_spool")
+        self.index_dir = index_dir or os.getenv("RAG_INDEX_DIR", "rag_index")
+        self.concurrency = concurrency or int(os.getenv("INGEST_CONCURRENCY", "2"))
+        self.max_jobs = max_jobs or int(os.getenv("INGEST_MAX_JOBS", "10000"))
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._indexes: Dict[str, VectorIndex] = {}
+        self.jobs_dir = os.path.join(self.index_dir, "_jobs")
+
+    def spool_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, job_id)
+
+    async def start(self) -> None:
+        if not self.enabled or self._workers:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _record_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: IngestJob) -> None:
+        path = self._record_path(job.id)
+        part = f"{path}.{os.getpid()}.part"
+        try:
+            with open(part, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f)
+            os.replace(part, path)
+        except OSError as e:
+            logger.warning("Could not record ingestion job %s: %s", job.id, e)
+
+    def _load(self, job_id: str) -> Optional[IngestJob]:
+        try:
+            with open(self._record_path(job_id), encoding="utf-8") as f:
+                return IngestJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """This worker's job, else the record written by whichever worker ran it."""
+        return self._jobs.get(job_id) or self._load(job_id)
+
+    def known(self, job_id: str) -> bool:
+        """True when this content is already queued or running here, or indexed by any worker.
+
+        Failed and skipped jobs may be retried; records of other workers'
+        unfinished jobs are not trusted, since that worker may have died.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.status in ("queued", "running", "done")
+        job = self._load(job_id)
+        return job is not None and job.status == "done"
+
+    def submit(self, job_id: str, filename: str, domain: str, **extra: Any) -> IngestJob:
+        """Queue the spooled file ``spool_path(job_id)``; returns the existing job for known content."""
+        if self.known(job_id):
+            return self.get(job_id)
+        job = IngestJob(job_id, self.spool_path(job_id), filename, domain, extra)
+        self._jobs[job_id] = job
+        self._trim()
+        if self._queue is None:
+            job.status = "skipped"
+            job.error = "ingestion queue is not running"
+        else:
+            self._queue.put_nowait(job)
+        self._save(job)
+        return job
+
+    def _trim(self) -> None:
+        # forget the oldest finished jobs; queued/running ones are kept
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in ("done", "failed", "skipped"):
+                del self._jobs[job_id]
+                excess -= 1
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                job.metadata = await loop.run_in_executor(self._executor, self._process, job)
+                job.status = "done"
+            except Exception as e:
+                logger.exception("Ingestion failed for %s", job.filename)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._save(job)
+                self._queue.task_done()
+
+    def _index(self, domain: str) -> VectorIndex:
+        idx = self._indexes.get(domain)
+        if idx is None:
+            idx = self._indexes[domain] = VectorIndex(self.index_dir, domain)
+        return idx
+
+    def _process(self, job: IngestJob) -> Dict[str, Any]:
+        # Docling picks the format from the extension, so expose the spool file under its real name
+        ext = os.path.splitext(job.filename)[1].lower()
+        path = job.path + ext
+        os.replace(job.path, path)
+        try:
+            size = os.path.getsize(path)
+            chunks = ingest_file(
+                self._index(job.domain), path, source=job.filename,
+                extra=dict(job.extra),
+            )
+        finally:
+            os.remove(path)
+        return {"size": size, "chunks": chunks, "sha256": job.extra.get("sha256")}
+
+
+# Shared queue, started/stopped by the FastAPI startup/shutdown hooks in main.py
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,58 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from .embedder import get_embedder
+from .index import EmbedderMismatchError, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Retriever:
+    """Top-k retrieval over the per-domain vector indexes in RAG_INDEX_DIR."""
+
+    def __init__(self, root: Optional[str] = None, top_k: Optional[int] = None,
+                 min_score: Optional[float] = None, max_context_chars: Optional[int] = None):
+        self.enabled = os.getenv("RAG_ENABLED", "1") == "1"
+        self.root = root or os.getenv("RAG_INDEX_DIR", "rag_index")
+        self.top_k = top_k or int(os.getenv("RAG_TOP_K", "4"))
+        self.min_score = min_score if min_score is not None else float(os.getenv("RAG_MIN_SCORE", "0.25"))
+        self.max_context_chars = max_context_chars or int(os.getenv("RAG_MAX_CONTEXT_CHARS", "4000"))
+        self._indexes: Dict[str, VectorIndex] = {}
+
+    def index(self, domain: str) -> VectorIndex:
+        idx = self._indexes.get(domain)
+        if idx is None:
+            idx = self._indexes[domain] = VectorIndex(self.root, domain)
+        return idx
+
+    def has_index(self, domain: str) -> bool:
+        return os.path.exists(os.path.join(self.root, domain, "meta.json"))
+
+    def _search(self, domain: str, query: str) -> List[Tuple[float, Dict[str, Any]]]:
+        embedder = get_embedder()
+        vector = embedder.embed([query])[0]
+        try:
+            hits = self.index(domain).search(vector, self.top_k, embedder)
+        except EmbedderMismatchError as e:
+            # answer without excerpts rather than with meaningless ones
+            logger.warning("RAG disabled for %s: %s", domain, e)
+            return []
+        return [(score, chunk) for score, chunk in hits if score >= self.min_score]
+
+    async def retrieve(self, domain: str, query: str) -> List[Tuple[float, Dict[str, Any]]]:
+        if not self.enabled or not query.strip() or not self.has_index(domain):
+            return []
+        # embedding and the matrix-vector product are CPU work; keep them off the event loop
+        return await run_in_threadpool(self._search, domain, query)
+
+    def format_context(self, hits: List[Tuple[float, Dict[str, Any]]]) -> str:
+        """Render hits as numbered excerpts, capped at ``max_context_chars``."""
+        parts, used = [], 0
+        for n, (_, chunk) in enumerate(hits, start=1):
+            text = f"[{n}] ({chunk.get('source', 'unknown')}) {chunk['text']}"
+            if used + len(text) > self.max_context_chars:
+                break
+            parts.append(text)
+            used += len(text)
+        return "\n\n".join(parts)
@@ -1,23 +1,60 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import List, Optional
+from collections import Counter
+from dataclasses import dataclass
+from .. import config  # noqa: F401  (loads .env before the module-level objects below read it)
+from ..llm.admission import AdmissionController, RateLimited
 from ..llm.chatgroq_client import ChatGROQClient
-try:
-    from ..llm.langchain_chatgroq import ChatGROQLangChain
-except Exception:
-    ChatGROQLangChain = None
-from dotenv import load_dotenv
+from ..llm.context_builder import BuiltContext, ContextBuilder
+from ..llm.domain_detector import DomainDetector
+from ..llm.response_cache import ResponseCache
+from ..llm.singleflight import SingleFlight
+from ..rag.retriever import Retriever
+from ..sessions import create_session_backend
+import functools
+import json
+import logging
 import os
 import uuid
 
-load_dotenv()
-
 router = APIRouter()
 
-llm = ChatGROQClient()
+# global + per-key token buckets and a bounded wait queue in front of every upstream call;
+# clients report Groq's rate-limit headers back to it
+admission = AdmissionController()
+
+llm = ChatGROQClient(on_response=admission.observe)
+
+# conversation store: session_id -> (role, content) turns; backend picked by SESSION_BACKEND
+conversations = create_session_backend()
+
+# auto-routing; keeps per-session keyword scores so each turn only scans new messages
+domain_detector = DomainDetector()
+
+# replies for repeated questions (leave days, holiday calendar, ...) served without an upstream call
+response_cache = ResponseCache()
+
+# identical concurrent prompts share one upstream call
+inflight = SingleFlight()
+
+# top-k policy excerpts from the domain's vector index (built by app.rag.ingest)
+retriever = Retriever()
+
 
-# simple in-memory conversation store: session_id -> List[dict(role, content)]
-conversations = {}
+async def _summarize(previous: str, turns) -> str:
+    text = "\n".join(f"{role}: {content}" for role, content in turns)
+    prompt = f"Current summary:\n{previous or '(none yet)'}\n\nNew turns:\n{text}"
+    # low priority: deferred (raises RateLimited) rather than taking capacity from user requests
+    async with admission.admit_background(llm.api_key):
+        return await llm.chat(system_prompt=context_builder.summary_prompt(), messages=[("user", prompt)])
+
+
+# newest turns within CONTEXT_MAX_TOKENS; older ones folded into a cached background summary
+# (LLM summaries need the default key; without it folded turns are condensed extractively)
+context_builder = ContextBuilder(llm.model, summarizer=_summarize if llm.api_key else None)
 
 
 class Message(BaseModel):
@@ -39,54 +76,237 @@ class ChatResponse(BaseModel):
     api_key: Optional[str] = None
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+@dataclass
+class _ChatContext:
+    sid: str
+    domain: str
+    merged: list
+    new_turns: list
+    system_prompt: str
+    api_key: Optional[str]
+    context: BuiltContext  # what is actually sent upstream
+    domain_scores: Optional[Counter] = None  # auto-detection scores, cached once the turn is stored
+
+
+async def _prepare(req: ChatRequest) -> _ChatContext:
+    """Merge session history and resolve the domain, system prompt and api key."""
     domain = req.domain.lower() if req.domain else "auto"
+    sid = req.session_id or str(uuid.uuid4())
+
+    new_turns = [(m.role, m.content) for m in req.messages]
 
     # if a session id is provided, merge historic messages (if present)
-    if req.session_id:
-        history = conversations.get(req.session_id, [])
-        merged = history + [m.dict() for m in req.messages]
-    else:
-        merged = [m.dict() for m in req.messages]
+    history = await conversations.get(req.session_id) if req.session_id else []
+    merged = history + new_turns
 
     # auto domain detection
+    domain_scores = None
     if domain == "auto":
-        text = " ".join([m["content"] for m in merged]).lower()
-        if any(k in text for k in ["salary", "benefit", "hr", "leave", "hiring"]):
-            domain = "hr"
-        elif any(k in text for k in ["contract", "policy", "compliance", "nda", "legal"]):
-            domain = "legal"
-        elif any(k in text for k in ["ticket", "issue", "bug", "incident"]):
-            domain = "l1"
-        else:
-            domain = "l2"
+        domain, domain_scores = domain_detector.resolve(
+            (content for _, content in new_turns),
+            session_id=sid,
+            history=(content for _, content in history),
+        )
 
     system_prompt = f"You are an assistant handling {domain.upper()} inquiries. Be helpful and concise."
 
+    # ground the answer in the domain's documents; only the top-k chunks go into the prompt
+    query = next((content for role, content in reversed(new_turns) if role == "user"), "")
+    hits = await retriever.retrieve(domain, query)
+    if hits:
+        system_prompt += (
+            "\n\nUse these excerpts from company documents when they are relevant, citing them by number:\n\n"
+            + retriever.format_context(hits)
+        )
+
     # 🧠 dynamically use API key
     api_key = req.api_key or os.getenv("CHATGROQ_API_KEY")
 
+    context = context_builder.build(system_prompt, merged, sid)
+
+    return _ChatContext(sid, domain, merged, new_turns, system_prompt, api_key, context, domain_scores)
+
+
+def _client_for(api_key: Optional[str]) -> ChatGROQClient:
+    # reuse the module-level client for the default key; the HTTP pool is shared either way
+    return llm if api_key == llm.api_key else ChatGROQClient(api_key=api_key, on_response=admission.observe)
+
+
+def _too_many_requests(e: RateLimited) -> HTTPException:
+    return HTTPException(status_code=429, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+
+@functools.lru_cache(maxsize=1)
+def langchain_wrapper():
+    """The LangChain wrapper module, imported on first use (LangChain takes seconds to import); None if unavailable."""
+    try:
+        from ..llm import langchain_chatgroq
+    except Exception as e:
+        logging.warning(f"LangChain wrapper unavailable: {e}")
+        return None
+    return langchain_chatgroq
+
+
+_default_langchain_llm = None
+
+
+def _langchain_llm(api_key: Optional[str]):
+    # like _client_for: only the server key's wrapper is kept. Client-supplied keys get a
+    # throwaway wrapper, so they are not held in memory; connections are reused through
+    # http_pool's bounded LRU either way
+    global _default_langchain_llm
+    if api_key != llm.api_key:
+        return langchain_wrapper().ChatGROQLangChain(api_key=api_key, on_response=admission.observe)
+    if _default_langchain_llm is None:
+        _default_langchain_llm = langchain_wrapper().ChatGROQLangChain(api_key=api_key, on_response=admission.observe)
+    return _default_langchain_llm
+
+
+def _langchain_prompt(context: BuiltContext) -> str:
+    parts = [f"Summary of the earlier conversation:\n{context.summary}"] if context.summary else []
+    return "\n".join(parts + [content for _, content in context.messages])
+
+
+async def _remember(ctx: _ChatContext, reply: str) -> None:
+    """Store this turn's messages; turns the store drops to stay within its cap are summarized first."""
+    ctx.new_turns.append(("assistant", reply))
+    max_turns = conversations.max_turns
+    overflow = len(ctx.merged) + 1 - max_turns
+    if max_turns > 0 and overflow > 0:
+        context_builder.retire(ctx.sid, ctx.merged + [("assistant", reply)], overflow)
+    await conversations.append(ctx.sid, ctx.new_turns)
+    if ctx.domain_scores is not None:
+        domain_detector.commit(ctx.sid, ctx.domain_scores)
+
+
+def _cache_key(ctx: _ChatContext, client: ChatGROQClient) -> Optional[str]:
+    if not response_cache.enabled_for(ctx.domain):
+        return None
+    return response_cache.make_key(ctx.domain, ctx.system_prompt, client.model, ctx.merged)
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    ctx = await _prepare(req)
+
     # Decide whether to use LangChain wrapper. This can be triggered by setting
     # the environment variable USE_LANGCHAIN=1 or by using domain='langchain'.
-    use_langchain = (os.getenv("USE_LANGCHAIN") == "1") or (domain == "langchain")
+    use_langchain = (os.getenv("USE_LANGCHAIN") == "1") or (ctx.domain == "langchain")
 
-    if use_langchain and ChatGROQLangChain is not None:
-        # LangChain wrapper exposes a synchronous _call method that returns text
-        llm = ChatGROQLangChain(api_key=api_key)
+    if use_langchain and langchain_wrapper() is not None:
+        # awaited natively; sync-only LLMs are offloaded to a bounded thread pool
+        lc_llm = _langchain_llm(ctx.api_key)
         try:
-            reply = llm._call("\n".join([m["content"] for m in merged]))
+            async with admission.admit(ctx.api_key):
+                reply = await langchain_wrapper().apredict(lc_llm, _langchain_prompt(ctx.context))
+        except RateLimited as e:
+            raise _too_many_requests(e)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"LangChain wrapper error: {e}")
     else:
-        llm = ChatGROQClient(api_key=api_key)
+        client = _client_for(ctx.api_key)
+        cache_key = _cache_key(ctx, client)
+        reply = response_cache.get(cache_key) if cache_key else None
+
+        if reply is None:
+            async def call_upstream() -> str:
+                # coalesced callers share this one admission
+                async with admission.admit(ctx.api_key):
+                    result = await client.chat(system_prompt=ctx.context.system_prompt, messages=ctx.context.messages)
+                if cache_key:
+                    response_cache.put(cache_key, result)
+                return result
+
+            flight_key = inflight.make_key(ctx.domain, ctx.context.system_prompt, client.model, ctx.context.messages)
+            try:
+                reply = await inflight.do(flight_key, call_upstream)
+            except RateLimited as e:
+                raise _too_many_requests(e)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+    await _remember(ctx, reply)
+
+    return ChatResponse(reply=reply, domain=ctx.domain, session_id=ctx.sid)
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-Sent-Events variant of /chat that forwards tokens as they arrive.
+
+    Events: one ``meta`` event with the domain and session id, then unnamed
+    events carrying ``{"delta": ...}``, then ``done`` with the full reply (or
+    ``error`` if the upstream call fails mid-stream). Admission happens before
+    the stream starts, so an overloaded server answers 429 with Retry-After.
+    """
+    ctx = await _prepare(req)
+    client = _client_for(ctx.api_key)
+    cache_key = _cache_key(ctx, client)
+    cached = response_cache.get(cache_key) if cache_key else None
+
+    ticket = None
+    if cached is None:
         try:
-            reply = await llm.chat(system_prompt=system_prompt, messages=merged)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+            ticket = await admission.acquire(ctx.api_key)
+        except RateLimited as e:
+            raise _too_many_requests(e)
+
+    async def events():
+        yield _sse({"domain": ctx.domain, "session_id": ctx.sid}, event="meta")
+        reply = cached
+        if reply is not None:
+            yield _sse({"delta": reply})
+        else:
+            parts = []
+            try:
+                async for delta in client.stream_chat(system_prompt=ctx.context.system_prompt, messages=ctx.context.messages):
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+            except RateLimited as e:
+                yield _sse({"detail": e.detail, "status": 429, "retry_after": e.retry_after}, event="error")
+                return
+            except Exception as e:
+                logging.error(f"Streaming chat failed: {e}")
+                yield _sse({"detail": str(e)}, event="error")
+                return
+            reply = "".join(parts)
+            if cache_key:
+                response_cache.put(cache_key, reply)
+
+        await _remember(ctx, reply)
+        yield _sse({"reply": reply, "domain": ctx.domain, "session_id": ctx.sid}, event="done")
+
+    # disable proxy buffering so deltas reach the browser immediately
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    # the slot is released once the stream ends, including when the client disconnects
+    background = BackgroundTask(admission.release, ticket) if ticket is not None else None
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers, background=background)
+
+
+@router.get("/sessions/stats")
+async def session_stats():
+    """Session store size and eviction counters (for capacity planning)."""
+    return await conversations.stats()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Response cache size and hit/miss counters, plus in-flight coalescing counters."""
+    return {**response_cache.stats(), "singleflight": inflight.stats()}
+
+
+@router.get("/context/stats")
+async def context_stats():
+    """Context budget, tokenizer in use and conversation-summary counters."""
+    return context_builder.stats()
 
-    sid = req.session_id or str(uuid.uuid4())
-    conversations[sid] = merged + [{"role": "assistant", "content": reply}]
 
-    return ChatResponse(reply=reply, domain=domain, session_id=sid)
+@router.get("/admission/stats")
+async def admission_stats():
+    """Upstream slots in use, queue length, rejections and rate-limit pauses."""
+    return admission.stats()
@@ -0,0 +1,239 @@
+from collections import Counter
+from datetime import datetime
+from email.utils import format_datetime
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from ..storage import get_storage
+from ..storage.disk_cache import CacheEntry, download_cache
+from ..llm.singleflight import SingleFlight
+from .files import DOMAIN_CONTAINER_MAP
+import logging
+
+# Mounted under /api/files after the files router: the catch-all route below
+# must not shadow /list, /jobs/..., /sas/... and friends.
+router = APIRouter()
+
+# concurrent misses for the same blob share one origin download
+fills = SingleFlight()
+metrics: Counter = Counter()
+
+
+class CachedFileResponse(Response):
+    """Send ``count`` bytes of an open file starting at ``offset``.
+
+    When the ASGI server offers the ``http.response.zerocopysend`` extension
+    the file descriptor is handed to it (sendfile); otherwise the file is read
+    in chunks in a worker thread. The file is closed when the response ends.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, file, offset: int, count: int, status_code: int = 200,
+                 headers: Optional[dict] = None, media_type: Optional[str] = None):
+        self.file = file
+        self.offset = offset
+        self.count = count
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope.get("method") == "HEAD" or self.count == 0:
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopysend" in scope.get("extensions", {}):
+                metrics["zero_copy"] += 1
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file,
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+            else:
+                metrics["chunked"] += 1
+                await run_in_threadpool(self.file.seek, self.offset)
+                remaining = self.count
+                while remaining > 0:
+                    chunk = await run_in_threadpool(self.file.read, min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": b""})
+        finally:
+            self.file.close()
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None when the header should be ignored (other units, multiple
+    ranges, malformed) and the full body is sent instead.
+    """
+    if not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    start_s, sep, end_s = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_s:
+            suffix = int(end_s)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+        start = int(start_s)
+        end = min(int(end_s), size - 1) if end_s else size - 1
+    except ValueError:
+        return None
+    if start < 0 or start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == bare:
+            return True
+    return False
+
+
+def _http_date(value: Optional[datetime]) -> Optional[str]:
+    return format_datetime(value, usegmt=True) if value is not None else None
+
+
+async def _lookup(container: str, name: str):
+    """Cache entry (filled or revalidated as needed) or origin properties for an uncached blob."""
+    storage = get_storage()
+    if not storage.remote:
+        # already on local disk: nothing to cache
+        props = await storage.get_properties(container, name)
+        return None, props, "LOCAL" if props is not None else None
+
+    key = download_cache.key(container, name)
+    entry = await download_cache.get(key)
+    if entry is not None:
+        if download_cache.is_fresh(entry):
+            return entry, None, "HIT"
+        props = await storage.get_properties(container, name)
+        if props is None:
+            await download_cache.discard(key)
+            return None, None, None
+        if props["etag"] == entry.etag:
+            await download_cache.mark_checked(entry)
+            return entry, None, "REVALIDATED"
+        await download_cache.discard(key)
+    else:
+        props = await storage.get_properties(container, name)
+        if props is None:
+            return None, None, None
+
+    if not download_cache.cacheable(props["size"]):
+        return None, props, "BYPASS"
+
+    async def fill() -> CacheEntry:
+        return await download_cache.fill(
+            key, storage.get_range(container, name, etag=props["etag"]),
+            props["etag"], props["content_type"], _http_date(props["last_modified"]),
+        )
+
+    return await fills.do(key, fill), None, "MISS"
+
+
+@router.get("/cache/stats")
+async def download_cache_stats():
+    """Download cache hit/miss counters and how responses were sent."""
+    return {**await download_cache.stats(), **metrics, "coalesced_fills": fills.coalesced}
+
+
+@router.api_route("/{container}/{name:path}", methods=["GET", "HEAD"])
+async def download_file(container: str, name: str, request: Request):
+    """
+    Download a blob through the backend.
+
+    Supports ``Range`` (single byte range, 206/416) and ``If-None-Match``
+    (304). Blobs up to DOWNLOAD_CACHE_MAX_ENTRY_BYTES are served from the
+    local disk cache and revalidated by ETag every DOWNLOAD_CACHE_TTL_SECONDS;
+    larger ones are streamed from Blob Storage. With STORAGE_BACKEND=local the
+    stored file is sent directly. ``X-Cache`` reports HIT, MISS, REVALIDATED,
+    BYPASS or LOCAL.
+    """
+    if container not in DOMAIN_CONTAINER_MAP.values():
+        raise HTTPException(status_code=404, detail="Unknown container")
+    try:
+        entry, props, cache_status = await _lookup(container, name)
+    except Exception as e:
+        logging.error(f"Failed to fetch '{container}/{name}': {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+    if cache_status is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if entry is not None:
+        etag, size, content_type, last_modified = entry.etag, entry.size, entry.content_type, entry.last_modified
+    else:
+        etag, size, content_type = props["etag"], props["size"], props["content_type"]
+        last_modified = _http_date(props["last_modified"])
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "X-Cache": cache_status,
+    }
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        metrics["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            metrics["partial"] += 1
+    count = end - start + 1
+    headers["Content-Length"] = str(count)
+
+    if request.method == "HEAD" or count == 0:
+        return Response(status_code=status_code, headers=headers, media_type=content_type)
+
+    storage = get_storage()
+    path = entry.path if entry is not None else storage.local_path(container, name)
+    if path is not None:
+        try:
+            return CachedFileResponse(open(path, "rb"), start, count, status_code, headers, content_type)
+        except FileNotFoundError:
+            # evicted between lookup and open; stream this one from the origin
+            pass
+
+    metrics["origin_streams"] += 1
+    return StreamingResponse(
+        storage.get_range(container, name, start, count, etag=etag),
+        status_code=status_code, headers=headers, media_type=content_type,
+    )
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from typing import List
-from ..storage.azure_blob import blob_storage
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Query
+from fastapi.responses import RedirectResponse
+from typing import List, Optional, Union
+from ..storage import get_storage, UploadTooLargeError
+from ..rag.jobs import ingestion_queue, make_job_id
+import asyncio
+import hashlib
 import logging
+import shutil
 from starlette.concurrency import run_in_threadpool
 import os
 
@@ -15,53 +20,224 @@ DOMAIN_CONTAINER_MAP = {
     'l2': os.getenv('AZURE_CONTAINER_L2', 'l2docs'),
 }
 
+# bulk uploads: files per request and uploads running at once per request
+UPLOAD_BATCH_MAX_FILES = int(os.getenv('UPLOAD_BATCH_MAX_FILES', '500'))
+UPLOAD_BATCH_CONCURRENCY = int(os.getenv('UPLOAD_BATCH_CONCURRENCY', '8'))
+
 router = APIRouter()
 
+SHA256_PATTERN = r"^[0-9a-fA-F]{64}$"
+
+
+def _container_for(domain: Optional[str]) -> str:
+    return (DOMAIN_CONTAINER_MAP.get(domain.lower()) if domain else None) or DEFAULT_CONTAINER
+
+
+def _hash_upload(stream, limit: int) -> str:
+    """SHA-256 of the received upload spool; raises UploadTooLargeError past ``limit``."""
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    for block in iter(lambda: stream.read(1024 * 1024), b""):
+        size += len(block)
+        if size > limit:
+            raise UploadTooLargeError(f"Upload exceeds the {limit} byte limit")
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _spool_for_ingestion(stream, job_id: str) -> None:
+    """Copy the upload to the ingestion spool (unless that content is already known)."""
+    if ingestion_queue.known(job_id):
+        return
+    path = ingestion_queue.spool_path(job_id)
+    stream.seek(0)
+    # unique temp name: identical files in one batch may be spooled concurrently
+    part = f"{path}.{os.getpid()}-{id(stream)}.part"
+    with open(part, "wb") as f:
+        shutil.copyfileobj(stream, f, 1024 * 1024)
+    os.replace(part, path)
+
+
+async def _store_upload(file: UploadFile, domain: str) -> dict:
+    """Hash, store (or dedupe) and queue one uploaded file for ingestion."""
+    # Determine container based on domain (domain comes from multipart form)
+    container = _container_for(domain)
+
+    logging.info(f"Uploading file '{file.filename}' to container '{container}' (domain='{domain}')")
+
+    # the multipart body is already spooled locally; hashing it is cheap next to a network upload
+    storage = get_storage()
+    sha256 = await run_in_threadpool(_hash_upload, file.file, storage.max_upload_bytes)
+
+    # stream the upload spool in staged blocks (never read whole into memory)
+    result = await storage.upload_stream(
+        file,
+        file.filename,
+        file.content_type,
+        container,
+        sha256=sha256,
+    )
+
+    # conversion/indexing happens in the background; clients poll /jobs/{job_id}
+    # (deduplicated content is resubmitted unless its job is queued, running or done:
+    # it may have failed, been orphaned by a dead worker, or been stored before indexing)
+    index_domain = domain.lower() if domain else "auto"
+    if not ingestion_queue.enabled:
+        return result
+    if index_domain not in DOMAIN_CONTAINER_MAP or index_domain == "auto":
+        # chat only retrieves from the hr/legal/l1/l2 indexes, so there is nowhere to index this file
+        result["ingest_status"] = "skipped"
+        result["ingest_error"] = "choose a domain (hr, legal, l1, l2) to index this file for chat"
+        return result
+    job_id = make_job_id(index_domain, result["sha256"])
+    await run_in_threadpool(_spool_for_ingestion, file.file, job_id)
+    job = ingestion_queue.submit(
+        job_id, file.filename, index_domain,
+        container=container, blob_name=result["blob_name"], sha256=result["sha256"],
+    )
+    result["job_id"] = job.id
+    result["ingest_status"] = job.status
+    return result
+
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...), domain: str = Form("auto")):
     """
-    Upload a file to Azure Blob Storage.
-    
-    The file will be stored with a timestamp-prefixed name to ensure uniqueness.
+    Upload a file to the configured storage backend (Azure Blob Storage by default).
+
+    The file is hashed first; if the container already holds the same content
+    the existing blob is returned with ``deduplicated: true`` and nothing is
+    uploaded. New content is stored as ``{timestamp}-{sha256[:12]}-{filename}``.
     Returns a dict containing the blob name, URL (with SAS token), and metadata.
     """
     try:
-        content = await file.read()
-        # Determine container based on domain (domain comes from multipart form)
-        container = DOMAIN_CONTAINER_MAP.get(domain.lower()) if domain else None
-        if not container:
-            container = DEFAULT_CONTAINER
-
-        logging.info(f"Uploading file '{file.filename}' to container '{container}' (domain='{domain}')")
-
-        # call sync upload in threadpool (pass container name)
-        result = await run_in_threadpool(
-            blob_storage.upload_file,
-            content,
-            file.filename,
-            file.content_type,
-            container,
-        )
-        return result
+        return await _store_upload(file, domain)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logging.error(f"Failed to upload file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.post("/upload-batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    domain: str = Form("auto"),
+    domains: Optional[List[str]] = Form(None),
+):
+    """
+    Upload many files in one request.
+
+    ``domain`` applies to every file unless ``domains`` gives one value per
+    file (same order as ``files``). Up to UPLOAD_BATCH_CONCURRENCY files are
+    uploaded at once. Each file gets its own result, so one failure does not
+    fail the batch: ``{filename, status: "ok", ...upload result}`` or
+    ``{filename, status: "error", status_code, error}``.
+    """
+    if len(files) > UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {UPLOAD_BATCH_MAX_FILES} files per batch")
+    if domains and len(domains) != len(files):
+        raise HTTPException(status_code=400, detail="'domains' must have one entry per file")
+    file_domains = domains or [domain] * len(files)
+    semaphore = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+
+    async def upload_one(file: UploadFile, file_domain: str) -> dict:
+        async with semaphore:
+            try:
+                result = await _store_upload(file, file_domain)
+                return {"filename": file.filename, "status": "ok", "domain": file_domain, **result}
+            except UploadTooLargeError as e:
+                return {"filename": file.filename, "status": "error", "status_code": 413, "error": str(e)}
+            except Exception as e:
+                logging.error(f"Failed to upload file '{file.filename}': {str(e)}")
+                return {"filename": file.filename, "status": "error", "status_code": 500, "error": str(e)}
+
+    results = await asyncio.gather(*(upload_one(f, d) for f, d in zip(files, file_domains)))
+    failed = sum(1 for r in results if r["status"] == "error")
+    return {"uploaded": len(results) - failed, "failed": failed, "results": results}
+
 @router.get("/list")
-async def list_files(max_results: int = 100, domain: str = "auto") -> List[dict]:
+async def list_files(
+    page_size: int = Query(100, ge=1, le=5000),
+    continuation_token: Optional[str] = None,
+    prefix: Optional[str] = None,
+    domain: str = "auto",
+    max_results: Optional[int] = Query(None, ge=1, le=5000, deprecated=True),
+) -> Union[dict, List[dict]]:
     """
-    List files in the blob storage container.
-    Returns a list of dicts containing file metadata and SAS URLs.
+    List one page of files in the blob storage container.
+    Pass the returned ``continuation_token`` back to get the next page; it is
+    None on the last page. ``prefix`` filters by blob name prefix.
+    Returns ``{"items": [...], "continuation_token": ...}`` where items contain
+    file metadata and SAS URLs.
+    Deprecated: with ``max_results`` the old response shape is kept, a plain
+    array of up to ``max_results`` items gathered across pages.
     """
     try:
-        container = DOMAIN_CONTAINER_MAP.get(domain.lower()) if domain else None
-        if not container:
-            container = DEFAULT_CONTAINER
+        container = _container_for(domain)
 
         logging.info(f"Listing files from container '{container}' (domain='{domain}')")
 
-        files = await run_in_threadpool(blob_storage.list_files, max_results, container)
-        return files
+        storage = get_storage()
+        if max_results is None:
+            return await storage.list_page(
+                page_size, container,
+                continuation_token=continuation_token, prefix=prefix,
+            )
+
+        items: List[dict] = []
+        token = continuation_token
+        while len(items) < max_results:
+            page = await storage.list_page(max_results - len(items), container, continuation_token=token, prefix=prefix)
+            items.extend(page["items"])
+            token = page["continuation_token"]
+            if not token:
+                break
+        return items[:max_results]
     except Exception as e:
         logging.error(f"Failed to list files: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/exists")
+async def file_exists(sha256: str = Query(..., regex=SHA256_PATTERN), domain: str = "auto"):
+    """
+    Precheck before uploading: does the domain's container already hold this content?
+    Returns ``{exists: false}`` or ``{exists: true, blob_name, url, size, ...}``.
+    """
+    try:
+        existing = await get_storage().exists_by_hash(sha256, _container_for(domain))
+    except Exception as e:
+        logging.error(f"Failed to look up file hash: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if existing is None:
+        return {"exists": False, "sha256": sha256.lower()}
+    return {"exists": True, **existing}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background ingestion job (job ids are ``{domain}-{sha256}``)."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.to_dict()
+
+
+@router.get("/sas/stats")
+async def sas_stats():
+    """SAS token cache counters (Azure backend only)."""
+    sas = getattr(get_storage(), "sas", None)
+    if sas is None:
+        raise HTTPException(status_code=404, detail="The storage backend does not use SAS URLs")
+    return sas.stats()
+
+
+@router.get("/sas/{container}/{name:path}")
+async def sas_redirect(container: str, name: str):
+    """Mint (or reuse) a read SAS for one blob and redirect to it; the target of SAS_LAZY=1 listing URLs."""
+    sas = getattr(get_storage(), "sas", None)
+    if sas is None or container not in DOMAIN_CONTAINER_MAP.values():
+        raise HTTPException(status_code=404, detail="Unknown container")
+    return RedirectResponse(await sas.url(container, name), status_code=307)
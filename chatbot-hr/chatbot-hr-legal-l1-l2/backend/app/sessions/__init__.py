@@ -0,0 +1,18 @@
+# sessions package
+import os
+from .base import SessionBackend, Turn
+
+
+def create_session_backend(kind: str = None) -> SessionBackend:
+    """Build the backend selected by SESSION_BACKEND (memory, sqlite or redis)."""
+    kind = (kind or os.getenv("SESSION_BACKEND", "memory")).lower()
+    if kind == "memory":
+        from .memory import MemorySessionBackend
+        return MemorySessionBackend()
+    if kind == "sqlite":
+        from .sqlite import SQLiteSessionBackend
+        return SQLiteSessionBackend()
+    if kind == "redis":
+        from .redis_store import RedisSessionBackend
+        return RedisSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND '{kind}' (expected memory, sqlite or redis)")
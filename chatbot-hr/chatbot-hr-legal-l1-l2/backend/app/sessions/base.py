@@ -0,0 +1,40 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+# compact history entry: (role, content)
+Turn = Tuple[str, str]
+
+
+class SessionBackend(ABC):
+    """Async conversation storage shared by the chat endpoints.
+
+    Implementations keep at most a configured number of turns per session and
+    expire idle sessions. ``append`` writes all given turns in one batch.
+    """
+
+    name = "base"
+    # turns kept per session (older ones are dropped on append); 0 or less = unbounded
+    max_turns = 0
+
+    @abstractmethod
+    async def get(self, sid: str) -> List[Turn]:
+        """Return the session history (oldest first), or [] for unknown sessions."""
+
+    @abstractmethod
+    async def append(self, sid: str, turns: Iterable[Turn]) -> None:
+        """Append turns to a session, creating it if needed."""
+
+    async def append_many(self, batch: Mapping[str, Iterable[Turn]]) -> None:
+        """Append to several sessions; backends override this to use one round trip."""
+        for sid, turns in batch.items():
+            await self.append(sid, turns)
+
+    @abstractmethod
+    async def delete(self, sid: str) -> None:
+        ...
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,114 @@
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+from .base import SessionBackend, Turn
+
+
+class _Session:
+    __slots__ = ("turns", "last_access")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns if max_turns > 0 else None)
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """Bounded in-process conversation store.
+
+    Sessions are kept in LRU order, capped at ``max_sessions`` and dropped
+    after ``ttl_seconds`` without activity. Each session keeps at most
+    ``max_turns`` messages; older ones fall off as new ones are appended.
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 max_turns: Optional[int] = None):
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+        self.max_turns = max_turns if max_turns is not None else int(os.getenv("SESSION_MAX_TURNS", "50"))
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.truncated_turns = 0
+
+    def _expire(self, now: float) -> None:
+        # LRU order is also last-access order, so expired sessions are at the front
+        cutoff = now - self.ttl_seconds
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if session.last_access >= cutoff:
+                break
+            del self._sessions[sid]
+            self.evicted_ttl += 1
+
+    def _touch(self, sid: str, create: bool) -> Optional[_Session]:
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(sid)
+        if session is None:
+            if not create:
+                return None
+            session = _Session(self.max_turns)
+            self._sessions[sid] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted_lru += 1
+        else:
+            self._sessions.move_to_end(sid)
+        session.last_access = now
+        return session
+
+    def get(self, sid: str) -> List[Turn]:
+        """Return the session history (oldest first), or [] for unknown sessions."""
+        session = self._touch(sid, create=False)
+        return list(session.turns) if session else []
+
+    def append(self, sid: str, turns: Iterable[Turn]) -> None:
+        """Append turns in place, creating the session if needed."""
+        session = self._touch(sid, create=True)
+        dq = session.turns
+        for turn in turns:
+            if len(dq) == dq.maxlen:
+                self.truncated_turns += 1
+            dq.append(turn)
+
+    def delete(self, sid: str) -> None:
+        self._sessions.pop(sid, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        self._expire(time.monotonic())
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+            "truncated_turns": self.truncated_turns,
+        }
+
+
+class MemorySessionBackend(SessionBackend):
+    """Per-process backend around SessionStore; sessions are not shared across workers."""
+
+    name = "memory"
+
+    def __init__(self, store: Optional[SessionStore] = None):
+        self.store = store or SessionStore()
+
+    @property
+    def max_turns(self) -> int:
+        return self.store.max_turns
+
+    async def get(self, sid: str) -> List[Turn]:
+        return self.store.get(sid)
+
+    async def append(self, sid: str, turns: Iterable[Turn]) -> None:
+        self.store.append(sid, turns)
+
+    async def delete(self, sid: str) -> None:
+        self.store.delete(sid)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.store.stats()}
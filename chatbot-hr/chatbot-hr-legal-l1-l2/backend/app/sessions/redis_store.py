@@ -0,0 +1,75 @@
+import os
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from .base import SessionBackend, Turn
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # optional dependency, only needed for SESSION_BACKEND=redis
+    aioredis = None
+
+
+class RedisSessionBackend(SessionBackend):
+    """Backend for any Redis-protocol server (Redis, Valkey, KeyDB, ...).
+
+    Each session is a list of JSON ``[role, content]`` items. Appends are sent
+    as one pipelined RPUSH + LTRIM + EXPIRE, so the turn cap and idle TTL are
+    enforced by the server. Pass ``client`` to use an existing connection
+    (e.g. a fakeredis instance in local testing).
+    """
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, client: Any = None, ttl_seconds: Optional[float] = None,
+                 max_turns: Optional[int] = None, prefix: Optional[str] = None):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package")
+            client = aioredis.from_url(url or os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"))
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", "3600")))
+        self.max_turns = max_turns if max_turns is not None else int(os.getenv("SESSION_MAX_TURNS", "50"))
+        self.prefix = prefix or os.getenv("SESSION_REDIS_PREFIX", "chat:session:")
+
+    def _key(self, sid: str) -> str:
+        return f"{self.prefix}{sid}"
+
+    async def get(self, sid: str) -> List[Turn]:
+        key = self._key(sid)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(key, -self.max_turns if self.max_turns > 0 else 0, -1)
+        pipe.expire(key, self.ttl_seconds)
+        items, _ = await pipe.execute()
+        return [tuple(json.loads(item)) for item in items]
+
+    def _queue_append(self, pipe, sid: str, turns: Iterable[Turn]) -> None:
+        values = [json.dumps([role, content]) for role, content in turns]
+        key = self._key(sid)
+        if values:
+            pipe.rpush(key, *values)
+        if self.max_turns > 0:
+            pipe.ltrim(key, -self.max_turns, -1)
+        pipe.expire(key, self.ttl_seconds)
+
+    async def append(self, sid: str, turns: Iterable[Turn]) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        self._queue_append(pipe, sid, turns)
+        await pipe.execute()
+
+    async def append_many(self, batch: Mapping[str, Iterable[Turn]]) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        for sid, turns in batch.items():
+            self._queue_append(pipe, sid, turns)
+        await pipe.execute()
+
+    async def delete(self, sid: str) -> None:
+        await self.client.delete(self._key(sid))
+
+    async def stats(self) -> Dict[str, Any]:
+        # server-side eviction is governed by the TTL and the server's maxmemory policy
+        return {"backend": self.name, "keys": await self.client.dbsize(), "ttl_seconds": self.ttl_seconds}
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from starlette.concurrency import run_in_threadpool
+from .base import SessionBackend, Turn
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access);
+CREATE TABLE IF NOT EXISTS turns (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id, seq);
+"""
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Single-host backend on a SQLite file in WAL mode.
+
+    All uvicorn workers on the host open the same file; WAL lets readers run
+    alongside the single writer. Blocking calls run in the threadpool.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                 max_turns: Optional[int] = None, max_sessions: Optional[int] = None):
+        self.path = path or os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+        self.max_turns = max_turns if max_turns is not None else int(os.getenv("SESSION_MAX_TURNS", "50"))
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        self._writes = 0
+        self.evicted = 0
+
+    def _get(self, sid: str) -> List[Turn]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_access FROM sessions WHERE session_id = ?", (sid,)
+            ).fetchone()
+            if row is None:
+                return []
+            if row[0] < now - self.ttl_seconds:
+                # drop it now so a later append starts empty instead of reviving the old turns
+                cur = self._conn.cursor()
+                cur.execute("BEGIN IMMEDIATE")
+                try:
+                    self._expire(cur, sid, now)
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+                return []
+            self._conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, sid))
+            rows = self._conn.execute(
+                "SELECT role, content FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (sid, self.max_turns if self.max_turns > 0 else -1),
+            ).fetchall()
+        rows.reverse()
+        return [(role, content) for role, content in rows]
+
+    def _append_many(self, batch: Mapping[str, Iterable[Turn]]) -> None:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                for sid, turns in batch.items():
+                    self._expire(cur, sid, now)
+                    cur.execute(
+                        "INSERT INTO sessions(session_id, last_access) VALUES (?, ?) "
+                        "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                        (sid, now),
+                    )
+                    cur.executemany(
+                        "INSERT INTO turns(session_id, role, content) VALUES (?, ?, ?)",
+                        [(sid, role, content) for role, content in turns],
+                    )
+                    # keep only the newest max_turns rows for this session
+                    if self.max_turns > 0:
+                        cur.execute(
+                            "DELETE FROM turns WHERE session_id = ? AND seq <= ("
+                            "SELECT seq FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                            (sid, sid, self.max_turns),
+                        )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % 100 == 0:
+                # the append is committed; a failed purge is retried at the next interval
+                try:
+                    self._purge(now)
+                except sqlite3.Error as e:
+                    logger.warning("Session purge failed: %s", e)
+
+    def _expire(self, cur: sqlite3.Cursor, sid: str, now: float) -> None:
+        # inside a write transaction: delete the session's rows if it has been idle past the TTL
+        # (re-checked here, since another worker may have just refreshed it)
+        cutoff = now - self.ttl_seconds
+        cur.execute(
+            "DELETE FROM turns WHERE session_id = ? AND EXISTS ("
+            "SELECT 1 FROM sessions WHERE session_id = ? AND last_access < ?)",
+            (sid, sid, cutoff),
+        )
+        cur.execute("DELETE FROM sessions WHERE session_id = ? AND last_access < ?", (sid, cutoff))
+        self.evicted += cur.rowcount
+
+    def _purge(self, now: float) -> None:
+        # called with the lock held: drop idle sessions, then the least recently used overflow
+        cur = self._conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS doomed (session_id TEXT PRIMARY KEY)"
+            )
+            cur.execute("DELETE FROM doomed")
+            cur.execute(
+                "INSERT INTO doomed SELECT session_id FROM sessions WHERE last_access < ?",
+                (now - self.ttl_seconds,),
+            )
+            cur.execute(
+                "INSERT OR IGNORE INTO doomed SELECT session_id FROM sessions "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (self.max_sessions,),
+            )
+            cur.execute("DELETE FROM turns WHERE session_id IN (SELECT session_id FROM doomed)")
+            cur.execute("DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM doomed)")
+            evicted = cur.rowcount
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        self.evicted += evicted
+
+    def _delete(self, sid: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (sid,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (sid,))
+
+    def _count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def get(self, sid: str) -> List[Turn]:
+        return await run_in_threadpool(self._get, sid)
+
+    async def append(self, sid: str, turns: Iterable[Turn]) -> None:
+        await run_in_threadpool(self._append_many, {sid: list(turns)})
+
+    async def append_many(self, batch: Mapping[str, Iterable[Turn]]) -> None:
+        await run_in_threadpool(self._append_many, {sid: list(t) for sid, t in batch.items()})
+
+    async def delete(self, sid: str) -> None:
+        await run_in_threadpool(self._delete, sid)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "sessions": await run_in_threadpool(self._count),
+            "max_sessions": self.max_sessions,
+            "evicted": self.evicted,
+        }
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
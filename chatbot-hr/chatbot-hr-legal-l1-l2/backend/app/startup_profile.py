@@ -0,0 +1,91 @@
+"""Measure cold-start cost: how long importing the app takes, per module.
+
+    python -m app.startup_profile                  # top 25 modules by cumulative time
+    python -m app.startup_profile --top 50 --module app.main --budget-ms 1000
+
+Imports the module in a fresh interpreter with ``python -X importtime`` (so
+nothing is cached from this process), then prints the slowest modules by
+cumulative and by self time, and the total self time per top-level package.
+Exits with status 1 when the total import time is over ``--budget-ms``, so it
+can gate CI.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from collections import Counter
+from typing import List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (self us, cumulative us, depth, module)
+ImportRecord = Tuple[int, int, int, str]
+
+
+def measure(module: str) -> Tuple[List[ImportRecord], float]:
+    """Import ``module`` in a child interpreter; returns its importtime records and wall time in ms."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        lines = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        raise SystemExit(f"importing {module} failed:\n" + "\n".join(lines[-20:]))
+    return parse_importtime(proc.stderr), wall_ms
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((int(parts[0]), int(parts[1]), depth, name.strip()))
+    return records
+
+
+def report(records: List[ImportRecord], wall_ms: float, top: int) -> float:
+    min_depth = min((r[2] for r in records), default=0)
+    total_ms = sum(r[1] for r in records if r[2] == min_depth) / 1000
+
+    print(f"total import time {total_ms:.0f} ms ({len(records)} modules), interpreter wall time {wall_ms:.0f} ms\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for self_us, cum_us, _, name in sorted(records, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"{cum_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+    print(f"\n{'self ms':>9}  module (slowest by own time)")
+    for self_us, _, _, name in sorted(records, key=lambda r: r[0], reverse=True)[:top]:
+        print(f"{self_us / 1000:9.1f}  {name}")
+
+    packages: Counter = Counter()
+    for self_us, _, _, name in records:
+        packages[name.split(".")[0]] += self_us
+    print(f"\n{'self ms':>9}  top-level package")
+    for package, self_us in packages.most_common(top):
+        print(f"{self_us / 1000:9.1f}  {package}")
+    return total_ms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-module import cost of the backend")
+    parser.add_argument("--module", default="app.main", help="module to import (default app.main)")
+    parser.add_argument("--top", type=int, default=25, help="rows per table")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when total import time exceeds this")
+    args = parser.parse_args()
+
+    records, wall_ms = measure(args.module)
+    total_ms = report(records, wall_ms, args.top)
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"\nover budget: {total_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
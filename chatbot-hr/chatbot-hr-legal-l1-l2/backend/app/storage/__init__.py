@@ -0,0 +1,33 @@
+# storage package
+import os
+from typing import Optional
+from .base import StorageBackend, UploadTooLargeError
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage_backend(kind: str = None) -> StorageBackend:
+    """Build the backend selected by STORAGE_BACKEND (azure or local)."""
+    kind = (kind or os.getenv("STORAGE_BACKEND", "azure")).lower()
+    if kind == "azure":
+        from .azure_blob import AzureBlobStorage
+        return AzureBlobStorage()
+    if kind == "local":
+        from .local_fs import LocalStorage
+        return LocalStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{kind}' (expected azure or local)")
+
+
+def get_storage() -> StorageBackend:
+    """The process-wide storage backend, created on first use."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage_backend()
+    return _storage
+
+
+async def close_storage() -> None:
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
@@ -1,140 +1,369 @@
 import os
-from typing import Optional, List
-from datetime import datetime, timedelta
-from azure.storage.blob import (
-    BlobServiceClient,
-    BlobClient,
-    ContainerClient,
-    generate_blob_sas,
-    BlobSasPermissions,
-    ContentSettings,
-)
-from azure.core.exceptions import ResourceExistsError
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class AzureBlobStorage:
+import base64
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional, Set, Dict, Tuple
+from datetime import datetime
+import aiohttp
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from .. import config  # noqa: F401  (loads .env)
+from .base import StorageBackend, UploadTooLargeError
+from .sas import SasMinter
+
+logger = logging.getLogger(__name__)
+
+
+class AzureBlobStorage(StorageBackend):
+    """Async Blob Storage access on ``azure.storage.blob.aio``.
+
+    One service client (and so one aiohttp connection pool) is shared by all
+    container and blob clients; it is created on first use inside the event
+    loop and closed by ``close()`` at shutdown. Containers are created at most
+    once per process and then remembered.
+
+    Uploads are content-addressed: the SHA-256 is stored in blob metadata and
+    (except on hierarchical-namespace accounts) as a ``sha256`` index tag,
+    and content that already exists in the target container is not uploaded
+    again (see ``exists_by_hash``).
+
+    Authenticates with AZURE_STORAGE_CONNECTION_STRING or, when that is unset,
+    with ``DefaultAzureCredential`` (azure-identity: managed identity,
+    workload identity, ``az login``...) against AZURE_STORAGE_ACCOUNT_URL.
+    Without an account key, read URLs are user delegation SAS.
+    """
+
+    name = "azure"
+
     def __init__(self):
         connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        if not connection_string:
-            raise ValueError("AZURE_STORAGE_CONNECTION_STRING not found in environment variables")
-        
-        self.service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.account_url = os.getenv("AZURE_STORAGE_ACCOUNT_URL", "").rstrip("/") or None
+        if not connection_string and not self.account_url:
+            raise ValueError(
+                "Set AZURE_STORAGE_CONNECTION_STRING, or AZURE_STORAGE_ACCOUNT_URL to sign in with DefaultAzureCredential"
+            )
+
+        self.connection_string = connection_string
+        self._credential = None
         self.container_name = os.getenv("AZURE_STORAGE_CONTAINER", "uploads")
-        
-        # Create container if it doesn't exist
-        try:
-            self.service_client.create_container(self.container_name)
-        except ResourceExistsError:
-            pass  # Container already exists
+        # streamed uploads: block size, blocks in flight per upload, and max upload size
+        self.block_size = int(os.getenv("UPLOAD_BLOCK_SIZE", str(4 * 1024 * 1024)))
+        self.upload_concurrency = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+        self.max_upload_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+        self.max_connections = int(os.getenv("AZURE_MAX_CONNECTIONS", "100"))
+        self.dedupe = os.getenv("UPLOAD_DEDUPE", "1") == "1"
+        self.dedupe_index_max = int(os.getenv("UPLOAD_DEDUPE_INDEX_MAX", "100000"))
+
+        self._service_client: Optional[BlobServiceClient] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._known_containers: Set[str] = set()
+        self._container_locks: Dict[str, asyncio.Lock] = {}
+        # (container, sha256) -> blob name; in front of the service-side tag index
+        self._hash_index: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        # hierarchical-namespace (ADLS Gen2) accounts reject blob index tags; learnt on first upload
+        self.tags_supported = True
+
         # Try to extract account key from connection string for SAS generation
         self.account_name = None
         self.account_key = None
-        parts = [p for p in connection_string.split(';') if p]
+        parts = [p for p in (connection_string or "").split(';') if p]
         for p in parts:
             if p.startswith('AccountName='):
                 self.account_name = p.split('=', 1)[1]
             if p.startswith('AccountKey='):
                 self.account_key = p.split('=', 1)[1]
-        if not self.account_name:
-            # fallback to service client
+
+        self.sas = SasMinter(self)
+
+    @property
+    def service_client(self) -> BlobServiceClient:
+        if self._service_client is None:
+            # aiohttp sessions must be created inside the running loop, so build on first use
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30)
+            )
+            transport = AioHttpTransport(session=self._session, session_owner=False)
+            if self.connection_string:
+                self._service_client = BlobServiceClient.from_connection_string(
+                    self.connection_string, transport=transport
+                )
+            else:
+                from azure.identity.aio import DefaultAzureCredential
+
+                self._credential = DefaultAzureCredential()
+                self._service_client = BlobServiceClient(
+                    self.account_url, credential=self._credential, transport=transport
+                )
+            if not self.account_name:
+                self.account_name = self._service_client.account_name
+        return self._service_client
+
+    async def close(self) -> None:
+        if self._service_client is not None:
+            await self._service_client.close()
+            self._service_client = None
+        if self._credential is not None:
+            await self._credential.close()
+            self._credential = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def ensure_container(self, container_name: str) -> None:
+        """Create the container once per process; later calls are a set lookup."""
+        if container_name in self._known_containers:
+            return
+        lock = self._container_locks.setdefault(container_name, asyncio.Lock())
+        async with lock:
+            if container_name in self._known_containers:
+                return
             try:
-                self.account_name = self.service_client.account_name
-            except Exception:
-                self.account_name = None
-    
-    def upload_file(self, file_content: bytes, filename: str, content_type: Optional[str] = None, container_name: Optional[str] = None) -> dict:
+                await self.service_client.create_container(container_name)
+            except ResourceExistsError:
+                pass  # Container already exists
+            self._known_containers.add(container_name)
+
+    async def blob_url(self, container_name: str, blob_name: str) -> str:
+        """Client-facing URL: a cached read SAS, or the lazy minting endpoint when SAS_LAZY=1."""
+        return self.sas.listing_url(container_name, blob_name) or await self.sas.url(container_name, blob_name)
+
+    def _remember_hash(self, container_name: str, sha256: str, blob_name: str) -> None:
+        key = (container_name, sha256)
+        self._hash_index[key] = blob_name
+        self._hash_index.move_to_end(key)
+        while len(self._hash_index) > self.dedupe_index_max:
+            self._hash_index.popitem(last=False)
+
+    async def exists_by_hash(self, sha256: str, container_name: Optional[str] = None) -> Optional[dict]:
+        """Return the stored blob with this content in the container, or None.
+
+        Looks in the in-process index first, then queries the blob index tags
+        (``find_blobs_by_tags``). The hit is confirmed with one HEAD request so
+        deleted blobs are not reported; the tag index itself is eventually
+        consistent and may miss uploads from the last few seconds.
         """
-        Upload a file to Azure Blob Storage.
-        
+        target_container = container_name or self.container_name
+        sha256 = sha256.lower()
+        key = (target_container, sha256)
+        blob_name = self._hash_index.get(key)
+        if blob_name is None:
+            if not self.tags_supported:
+                return None
+            query = f"@container='{target_container}' AND sha256='{sha256}'"
+            try:
+                async for blob in self.service_client.find_blobs_by_tags(query, results_per_page=1):
+                    blob_name = blob.name
+                    break
+            except HttpResponseError as e:
+                # e.g. accounts without blob index tags (hierarchical namespace)
+                logger.warning("Blob tag query failed, skipping dedupe lookup: %s", e)
+                return None
+            if blob_name is None:
+                return None
+
+        try:
+            props = await self.service_client.get_blob_client(target_container, blob_name).get_blob_properties()
+        except ResourceNotFoundError:
+            self._hash_index.pop(key, None)
+            return None
+        self._remember_hash(target_container, sha256, blob_name)
+        return {
+            "blob_name": blob_name,
+            "url": await self.blob_url(target_container, blob_name),
+            "content_type": getattr(props.content_settings, 'content_type', None),
+            "size": props.size,
+            "sha256": sha256,
+            "uploaded_at": props.creation_time.strftime("%Y%m%d-%H%M%S") if props.creation_time else None,
+            "deduplicated": True,
+        }
+
+    async def upload_stream(self, stream, filename: str, content_type: Optional[str] = None,
+                            container_name: Optional[str] = None, max_size: Optional[int] = None,
+                            sha256: Optional[str] = None) -> dict:
+        """
+        Stream a file-like object to Azure Blob Storage as staged blocks.
+
         Args:
-            file_content: The file content as bytes
+            stream: Readable binary stream; ``read`` may be sync or async (e.g. UploadFile)
             filename: Original filename
             content_type: Optional MIME type
-        
+            container_name: Target container (defaults to AZURE_STORAGE_CONTAINER)
+            max_size: Size limit in bytes (defaults to UPLOAD_MAX_BYTES)
+            sha256: Content hash, when the caller already knows it
+
+        With a known ``sha256`` and UPLOAD_DEDUPE on, content already stored in
+        the container is returned (``deduplicated: True``) without reading the
+        stream. Blob names are ``{timestamp}-{sha256[:12]}-{filename}`` (a random
+        id replaces the hash when it is not known up front) and the commit only
+        succeeds if the name is free, so uploads never overwrite each other.
+
+        At most ``upload_concurrency`` blocks of ``block_size`` bytes are in
+        memory at once; size (and SHA-256, when not given) is computed while
+        reading. The hash goes into blob metadata and, where the account
+        supports them, a ``sha256`` index tag. Raises
+        UploadTooLargeError once the stream passes ``max_size`` (staged blocks
+        that are never committed are discarded by the service).
+
         Returns:
-            dict with blob_name, url, and other metadata
+            dict with blob_name, url, size, sha256 and other metadata
         """
-        # Generate a unique blob name using timestamp
-        timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-        blob_name = f"{timestamp}-{filename}"
-        
+        limit = max_size or self.max_upload_bytes
+
         # Determine container to use
         target_container = container_name or self.container_name
-        # Ensure container exists
+        await self.ensure_container(target_container)
+
+        if sha256 and self.dedupe:
+            existing = await self.exists_by_hash(sha256, target_container)
+            if existing is not None:
+                return existing
+
+        timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        unique = sha256.lower()[:12] if sha256 else uuid.uuid4().hex[:12]
+        blob_name = f"{timestamp}-{unique}-{filename}"
+
+        blob_client = self.service_client.get_blob_client(target_container, blob_name)
+
+        # the caller's hash came from the same spool; only hash while reading when it is unknown
+        digest = None if sha256 else hashlib.sha256()
+        size = 0
+        block_ids = []
+        in_flight = deque()
         try:
-            self.service_client.create_container(target_container)
-        except ResourceExistsError:
-            pass
+            while True:
+                block = stream.read(self.block_size)
+                if asyncio.iscoroutine(block):
+                    block = await block
+                if not block:
+                    break
+                size += len(block)
+                if size > limit:
+                    raise UploadTooLargeError(f"Upload exceeds the {limit} byte limit")
+                if digest is not None:
+                    digest.update(block)
+                block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+                block_ids.append(block_id)
+                in_flight.append(asyncio.ensure_future(
+                    blob_client.stage_block(block_id, block, length=len(block))
+                ))
+                # bound memory: wait for the oldest block before reading past the window
+                if len(in_flight) >= self.upload_concurrency:
+                    await in_flight.popleft()
+            while in_flight:
+                await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
 
-        # Get container client
-        container_client = self.service_client.get_container_client(target_container)
+        hexdigest = digest.hexdigest() if digest is not None else sha256.lower()
 
-        # Upload the file (sync client)
-        blob_client = container_client.get_blob_client(blob_name)
         content_settings_obj = ContentSettings(content_type=content_type) if content_type else None
-        blob_client.upload_blob(file_content, blob_type="BlockBlob", content_settings=content_settings_obj, overwrite=True)
-
-        # Generate SAS URL that expires in 1 hour (for immediate viewing)
-        sas_token = generate_blob_sas(
-            account_name=self.account_name or self.service_client.account_name,
-            container_name=target_container,
-            blob_name=blob_name,
-            account_key=self.account_key or getattr(self.service_client.credential, 'account_key', None),
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=1)
-        )
-
-        blob_url = f"{blob_client.url}?{sas_token}"
+        try:
+            await self._commit(blob_client, block_ids, content_settings_obj, hexdigest)
+        except ResourceExistsError:
+            # same name means same timestamp and hash prefix: normally a concurrent upload of this content
+            props = await blob_client.get_blob_properties()
+            if (props.metadata or {}).get("sha256") != hexdigest:
+                raise
+            self._remember_hash(target_container, hexdigest, blob_name)
+            return await self.exists_by_hash(hexdigest, target_container)
+        self._remember_hash(target_container, hexdigest, blob_name)
 
         return {
             "blob_name": blob_name,
-            "url": blob_url,
+            "url": await self.blob_url(target_container, blob_name),
             "content_type": content_type,
-            "size": len(file_content),
+            "size": size,
+            "sha256": hexdigest,
             "uploaded_at": timestamp,
+            "deduplicated": False,
         }
-    
-    def list_files(self, max_results: Optional[int] = None, container_name: Optional[str] = None) -> List[dict]:
-        """List all files in the container (synchronous)
 
-        Returns a list of dicts with name, url, content_type, size, last_modified
-        """
-        target_container = container_name or self.container_name
-        # Ensure container exists (no-op if exists)
+    async def _commit(self, blob_client, block_ids, content_settings, sha256: str) -> None:
+        """Commit the staged blocks (only if the name is free), tagging them when the account allows."""
+        options = dict(
+            content_settings=content_settings,
+            metadata={"sha256": sha256},
+            etag="*",
+            match_condition=MatchConditions.IfMissing,
+        )
+        if not self.tags_supported:
+            await blob_client.commit_block_list(block_ids, **options)
+            return
         try:
-            self.service_client.create_container(target_container)
+            await blob_client.commit_block_list(block_ids, tags={"sha256": sha256}, **options)
         except ResourceExistsError:
-            pass
+            raise
+        except HttpResponseError as e:
+            if e.status_code not in (400, 409):
+                raise
+            # e.g. hierarchical namespace accounts: keep the hash in metadata only, dedupe stays in-process
+            await blob_client.commit_block_list(block_ids, **options)
+            self.tags_supported = False
+            logger.warning("Blob index tags rejected (%s); storing the hash in metadata only", e.error_code or e)
 
-        container_client = self.service_client.get_container_client(target_container)
-        files = []
+    async def get_properties(self, container_name: str, blob_name: str) -> Optional[dict]:
+        """ETag, size, content type and last-modified of one blob, or None if it does not exist."""
+        try:
+            props = await self.service_client.get_blob_client(container_name, blob_name).get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        return {
+            "etag": props.etag if props.etag.startswith('"') else f'"{props.etag}"',
+            "size": props.size,
+            "content_type": getattr(props.content_settings, 'content_type', None),
+            "last_modified": props.last_modified,
+        }
 
-        for blob in container_client.list_blobs():
-            sas_token = generate_blob_sas(
-                account_name=self.account_name or self.service_client.account_name,
-                container_name=target_container,
-                blob_name=blob.name,
-                account_key=self.account_key or getattr(self.service_client.credential, 'account_key', None),
-                permission=BlobSasPermissions(read=True),
-                expiry=datetime.utcnow() + timedelta(hours=1)
-            )
+    async def get_range(self, container_name: str, blob_name: str, offset: int = 0,
+                        length: Optional[int] = None, etag: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Stream ``length`` bytes from ``offset`` (to the end when None).
 
-            blob_url = f"{self.service_client.get_blob_client(target_container, blob.name).url}?{sas_token}"
+        With ``etag`` the read fails (ResourceModifiedError) if the blob changed
+        since that ETag was seen, so a response never mixes two versions.
+        """
+        kwargs = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        downloader = await self.service_client.get_blob_client(container_name, blob_name).download_blob(
+            offset=offset, length=length, max_concurrency=1, **kwargs
+        )
+        async for chunk in downloader.chunks():
+            yield chunk
+
+    async def list_page(self, page_size: int = 100, container_name: Optional[str] = None,
+                        continuation_token: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+        """List one page of files in the container
+
+        ``page_size`` and ``continuation_token`` are passed to the service
+        (``results_per_page``/``by_page``), so each call reads exactly one page.
+
+        Returns a dict with ``items`` (dicts with name, url, content_type, size,
+        last_modified) and ``continuation_token`` (None on the last page)
+        """
+        target_container = container_name or self.container_name
+        await self.ensure_container(target_container)
 
-            files.append({
-                "name": blob.name,
-                "url": blob_url,
-                "content_type": getattr(blob.content_settings, 'content_type', None),
-                "size": blob.size,
-                "last_modified": blob.last_modified.isoformat() if blob.last_modified is not None else None,
-            })
+        container_client = self.service_client.get_container_client(target_container)
+        files = []
 
-            if max_results and len(files) >= max_results:
-                break
+        pages = container_client.list_blobs(
+            name_starts_with=prefix or None, results_per_page=page_size
+        ).by_page(continuation_token=continuation_token or None)
 
-        return files
+        async for page in pages:
+            async for blob in page:
+                files.append({
+                    "name": blob.name,
+                    "url": await self.blob_url(target_container, blob.name),
+                    "content_type": getattr(blob.content_settings, 'content_type', None),
+                    "size": blob.size,
+                    "last_modified": blob.last_modified.isoformat() if blob.last_modified is not None else None,
+                })
+            break
 
-# Singleton instance
-blob_storage = AzureBlobStorage()
\ No newline at end of file
+        return {"items": files, "continuation_token": pages.continuation_token or None}
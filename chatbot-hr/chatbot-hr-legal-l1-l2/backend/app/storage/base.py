@@ -0,0 +1,83 @@
+import io
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload stream exceeds the configured size limit."""
+
+
+class StorageBackend(ABC):
+    """File storage used by the /api/files endpoints.
+
+    Containers are flat namespaces of named blobs. Uploads are
+    content-addressed: every stored blob carries its SHA-256, and content that
+    a container already holds is not stored again.
+
+    Result dicts share one shape: ``upload_stream`` and ``exists_by_hash``
+    return blob_name, url, content_type, size, sha256, uploaded_at and
+    deduplicated; ``get_properties`` returns etag (quoted), size,
+    content_type and last_modified (datetime).
+    """
+
+    name = "base"
+    # False when reads are already local, so the download proxy skips its disk cache
+    remote = True
+    container_name = "uploads"
+    max_upload_bytes = 100 * 1024 * 1024
+
+    @abstractmethod
+    async def upload_stream(self, stream, filename: str, content_type: Optional[str] = None,
+                            container_name: Optional[str] = None, max_size: Optional[int] = None,
+                            sha256: Optional[str] = None) -> dict:
+        """Store a readable binary stream (``read`` may be sync or async).
+
+        Raises UploadTooLargeError past ``max_size``. With a known ``sha256``
+        existing content is returned without reading the stream; the hash must
+        be of this stream (e.g. computed from the same spool) and is not
+        recomputed while uploading.
+        """
+
+    @abstractmethod
+    async def list_page(self, page_size: int = 100, container_name: Optional[str] = None,
+                        continuation_token: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+        """One page of blobs: ``{"items": [...], "continuation_token": str | None}``."""
+
+    @abstractmethod
+    async def get_properties(self, container_name: str, blob_name: str) -> Optional[dict]:
+        """Metadata of one blob, or None if it does not exist."""
+
+    @abstractmethod
+    def get_range(self, container_name: str, blob_name: str, offset: int = 0,
+                  length: Optional[int] = None, etag: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Async iterator over ``length`` bytes from ``offset`` (to the end when None).
+
+        With ``etag``, fails instead of returning bytes of a different version.
+        """
+
+    @abstractmethod
+    async def exists_by_hash(self, sha256: str, container_name: Optional[str] = None) -> Optional[dict]:
+        """The stored blob with this content in the container, or None."""
+
+    @abstractmethod
+    async def blob_url(self, container_name: str, blob_name: str) -> str:
+        """Client-facing URL for one blob."""
+
+    def local_path(self, container_name: str, blob_name: str) -> Optional[str]:
+        """Path of the blob's bytes on this host, for backends that have one."""
+        return None
+
+    async def upload_file(self, file_content: bytes, filename: str, content_type: Optional[str] = None,
+                          container_name: Optional[str] = None) -> dict:
+        """Upload in-memory bytes (see upload_stream)."""
+        return await self.upload_stream(io.BytesIO(file_content), filename, content_type, container_name)
+
+    async def list_files(self, *args, **kwargs) -> dict:
+        """Older name for ``list_page``."""
+        return await self.list_page(*args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    async def close(self) -> None:
+        pass
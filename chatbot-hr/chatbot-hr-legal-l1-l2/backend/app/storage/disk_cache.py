@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """One cached blob: the local file plus the origin metadata needed to serve it."""
+
+    __slots__ = ("key", "path", "size", "etag", "content_type", "last_modified", "checked_at")
+
+    def __init__(self, key: str, path: str, size: int, etag: str, content_type: Optional[str],
+                 last_modified: Optional[str], checked_at: float):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.content_type = content_type
+        self.last_modified = last_modified
+        self.checked_at = checked_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "size": self.size,
+            "etag": self.etag,
+            "content_type": self.content_type,
+            "last_modified": self.last_modified,
+            "checked_at": self.checked_at,
+        }
+
+
+class DiskLRUCache:
+    """Size-bounded read-through cache of blobs on local disk.
+
+    Each blob is stored as ``<root>/<h[:2]>/<h>`` with a ``<h>.json`` sidecar
+    (etag, content type, size), where ``h`` is the SHA-256 of the cache key.
+    Files are written to a temp name and renamed into place, so readers never
+    see partial content. Least-recently-used entries are evicted once the
+    total passes ``max_bytes``; entries older than ``ttl`` seconds should be
+    revalidated against the origin ETag by the caller (``is_fresh``). The
+    index is rebuilt from the sidecars on first use, so a restart keeps the
+    cache warm. The rebuild, evictions and sidecar writes do their file I/O
+    in the threadpool, never on the event loop.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None,
+                 max_entry_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.enabled = os.getenv("DOWNLOAD_CACHE_ENABLED", "1") == "1"
+        self.root = root or os.getenv("DOWNLOAD_CACHE_DIR", "download_cache")
+        self.max_bytes = max_bytes or int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+        self.max_entry_bytes = max_entry_bytes or int(os.getenv("DOWNLOAD_CACHE_MAX_ENTRY_BYTES", str(64 * 1024 * 1024)))
+        self.ttl = ttl if ttl is not None else float(os.getenv("DOWNLOAD_CACHE_TTL_SECONDS", "60"))
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        # orders unlinks after index changes against fills that put a key back at the same path
+        self._files_lock: Optional[asyncio.Lock] = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.refreshed = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def key(container_name: str, blob_name: str) -> str:
+        return f"{container_name}/{blob_name}"
+
+    def _path(self, key: str) -> str:
+        h = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, h[:2], h)
+
+    def _scan(self) -> List[Tuple[float, CacheEntry]]:
+        # threadpool: (sidecar mtime, entry) for every intact entry, cleaning up the rest
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".part"):
+                    # left behind by a crash mid-write
+                    os.remove(os.path.join(dirpath, filename))
+                    continue
+                if not filename.endswith(".json"):
+                    continue
+                sidecar = os.path.join(dirpath, filename)
+                try:
+                    with open(sidecar, encoding="utf-8") as f:
+                        meta = json.load(f)
+                    path = sidecar[:-len(".json")]
+                    if os.path.getsize(path) != meta["size"]:
+                        raise ValueError("size mismatch")
+                except (OSError, ValueError, KeyError):
+                    logger.warning("Dropping unreadable download cache entry %s", sidecar)
+                    self._remove_files(sidecar[:-len(".json")])
+                    continue
+                found.append((os.path.getmtime(sidecar), CacheEntry(
+                    meta["key"], path, meta["size"], meta["etag"], meta.get("content_type"),
+                    meta.get("last_modified"), meta.get("checked_at", 0.0),
+                )))
+        return found
+
+    async def load(self) -> None:
+        """Rebuild the index from the sidecars (once; later calls return at once)."""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            found = await run_in_threadpool(self._scan)
+            # oldest sidecar first approximates the LRU order from before the restart
+            for _, entry in sorted(found, key=lambda item: item[0]):
+                self._entries[entry.key] = entry
+                self._bytes += entry.size
+            self._loaded = True
+            await self._evict()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry (and mark it recently used), counting a hit or a miss."""
+        await self.load()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.checked_at < self.ttl
+
+    def cacheable(self, size: int) -> bool:
+        ok = self.enabled and size <= self.max_entry_bytes and size <= self.max_bytes
+        if not ok:
+            self.bypassed += 1
+        return ok
+
+    async def mark_checked(self, entry: CacheEntry) -> None:
+        """Record that the origin still has this ETag."""
+        entry.checked_at = time.time()
+        self.revalidated += 1
+        await run_in_threadpool(self._write_sidecar, entry)
+
+    def _drop(self, key: str) -> Optional[str]:
+        # forget the entry; returns its path for the caller to delete off the loop
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry.size
+        return entry.path
+
+    def _files(self) -> asyncio.Lock:
+        if self._files_lock is None:
+            self._files_lock = asyncio.Lock()
+        return self._files_lock
+
+    async def _unlink(self, dropped: List[Tuple[str, str]]) -> None:
+        """Delete the files of dropped (key, path) entries, unless a fill has since re-added the key."""
+        async with self._files():
+            paths = [path for key, path in dropped if key not in self._entries]
+            if paths:
+                await run_in_threadpool(self._remove_many, paths)
+
+    async def discard(self, key: str) -> None:
+        path = self._drop(key)
+        if path is not None:
+            await self._unlink([(key, path)])
+
+    async def fill(self, key: str, chunks: AsyncIterator[bytes], etag: str,
+                   content_type: Optional[str], last_modified: Optional[str]) -> CacheEntry:
+        """Write a blob from ``chunks`` into the cache and return its entry."""
+        await self.load()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            async with self._files():
+                if key in self._entries:
+                    # same path: the new file and sidecar replace the old ones
+                    self.refreshed += 1
+                    self._drop(key)
+                os.replace(tmp, path)
+                entry = CacheEntry(key, path, size, etag, content_type, last_modified, time.time())
+                await run_in_threadpool(self._write_sidecar, entry)
+                self._entries[key] = entry
+                self._bytes += size
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        await self._evict(keep=key)
+        return entry
+
+    def _write_sidecar(self, entry: CacheEntry) -> None:
+        tmp = f"{entry.path}.json.part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry.to_dict(), f)
+        os.replace(tmp, entry.path + ".json")
+
+    async def _evict(self, keep: Optional[str] = None) -> None:
+        # pick victims on the loop (index bookkeeping), unlink them in one threadpool call
+        doomed = []
+        while self._bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            doomed.append((key, self._drop(key)))
+            self.evictions += 1
+        if doomed:
+            await self._unlink(doomed)
+
+    @staticmethod
+    def _remove_files(path: str) -> None:
+        # open readers keep their file handle, so unlinking under them is safe on POSIX
+        for p in (path, path + ".json"):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def _remove_many(cls, paths: List[str]) -> None:
+        for path in paths:
+            cls._remove_files(path)
+
+    async def stats(self) -> Dict[str, Any]:
+        await self.load()
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "refreshed": self.refreshed,
+            "evictions": self.evictions,
+            "bypassed": self.bypassed,
+        }
+
+
+# Shared cache for the download proxy (routers/download.py)
+download_cache = DiskLRUCache()
@@ -0,0 +1,264 @@
+import os
+import json
+import mmap
+import time
+import asyncio
+import bisect
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from starlette.concurrency import run_in_threadpool
+from .base import StorageBackend, UploadTooLargeError
+
+
+class LocalStorage(StorageBackend):
+    """Blob storage in a local directory, for single-node deployments and perf tests.
+
+    Layout under STORAGE_LOCAL_ROOT, per container::
+
+        objects/<sha[:2]>/<sha[2:4]>/<sha>        content, stored once per container
+        objects/<sha[:2]>/<sha[2:4]>/<sha>.json   metadata of the first name it was stored under
+        names/<h[:2]>/<h>.json                    metadata per blob name (h = SHA-256 of the name)
+        .generation                               touched on every write
+
+    Every file is written to a temp file and moved into place with
+    ``os.replace``, so readers never see partial content. Reads memory-map the
+    object file. Listing uses an in-memory sorted name index, rebuilt when
+    another process has written to the container (``.generation`` changed).
+    """
+
+    name = "local"
+    remote = False
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("STORAGE_LOCAL_ROOT", "storage_data")
+        self.container_name = os.getenv("AZURE_STORAGE_CONTAINER", "uploads")
+        self.url_prefix = os.getenv("STORAGE_LOCAL_URL_PREFIX", "/api/files").rstrip("/")
+        self.block_size = int(os.getenv("UPLOAD_BLOCK_SIZE", str(4 * 1024 * 1024)))
+        self.read_chunk_size = int(os.getenv("STORAGE_LOCAL_READ_CHUNK", str(1024 * 1024)))
+        self.max_upload_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+        self.dedupe = os.getenv("UPLOAD_DEDUPE", "1") == "1"
+        # container -> (generation mtime, sorted blob names)
+        self._names: Dict[str, Tuple[int, List[str]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _container_dir(self, container_name: str) -> str:
+        if not container_name or container_name in (".", "..") or "/" in container_name or "\\" in container_name:
+            raise ValueError(f"Invalid container name '{container_name}'")
+        return os.path.join(self.root, container_name)
+
+    def _object_path(self, container_name: str, sha256: str) -> str:
+        return os.path.join(self._container_dir(container_name), "objects", sha256[:2], sha256[2:4], sha256)
+
+    def _name_path(self, container_name: str, blob_name: str) -> str:
+        h = hashlib.sha256(blob_name.encode("utf-8")).hexdigest()
+        return os.path.join(self._container_dir(container_name), "names", h[:2], h + ".json")
+
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _generation(self, container_name: str) -> int:
+        try:
+            return os.stat(os.path.join(self._container_dir(container_name), ".generation")).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _bump_generation(self, container_name: str) -> None:
+        path = os.path.join(self._container_dir(container_name), ".generation")
+        with open(path, "a"):
+            pass
+        os.utime(path)
+
+    def _lock(self, container_name: str) -> asyncio.Lock:
+        return self._locks.setdefault(container_name, asyncio.Lock())
+
+    async def _result(self, container_name: str, meta: Dict[str, Any], deduplicated: bool) -> dict:
+        return {
+            "blob_name": meta["name"],
+            "url": await self.blob_url(container_name, meta["name"]),
+            "content_type": meta.get("content_type"),
+            "size": meta["size"],
+            "sha256": meta["sha256"],
+            "uploaded_at": meta["uploaded_at"],
+            "deduplicated": deduplicated,
+        }
+
+    async def blob_url(self, container_name: str, blob_name: str) -> str:
+        """The backend's download endpoint; there is nothing to sign locally."""
+        return f"{self.url_prefix}/{container_name}/{quote(blob_name)}"
+
+    def local_path(self, container_name: str, blob_name: str) -> Optional[str]:
+        meta = self._read_json(self._name_path(container_name, blob_name))
+        return self._object_path(container_name, meta["sha256"]) if meta else None
+
+    async def exists_by_hash(self, sha256: str, container_name: Optional[str] = None) -> Optional[dict]:
+        target_container = container_name or self.container_name
+        sha256 = sha256.lower()
+        meta = await run_in_threadpool(self._read_json, self._object_path(target_container, sha256) + ".json")
+        if meta is None:
+            return None
+        return await self._result(target_container, meta, True)
+
+    async def upload_stream(self, stream, filename: str, content_type: Optional[str] = None,
+                            container_name: Optional[str] = None, max_size: Optional[int] = None,
+                            sha256: Optional[str] = None) -> dict:
+        """Copy the stream into the container; same naming and dedupe rules as the Azure backend."""
+        limit = max_size or self.max_upload_bytes
+        target_container = container_name or self.container_name
+        if sha256 and self.dedupe:
+            existing = await self.exists_by_hash(sha256, target_container)
+            if existing is not None:
+                return existing
+
+        tmp_dir = os.path.join(self._container_dir(target_container), "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        # the caller's hash came from the same spool; only hash while copying when it is unknown
+        digest = None if sha256 else hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    block = stream.read(self.block_size)
+                    if asyncio.iscoroutine(block):
+                        block = await block
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > limit:
+                        raise UploadTooLargeError(f"Upload exceeds the {limit} byte limit")
+                    if digest is not None:
+                        digest.update(block)
+                    await run_in_threadpool(f.write, block)
+            hexdigest = digest.hexdigest() if digest is not None else sha256.lower()
+            # check-and-commit under the container lock so concurrent identical uploads store one copy
+            async with self._lock(target_container):
+                if self.dedupe:
+                    existing = await self.exists_by_hash(hexdigest, target_container)
+                    if existing is not None:
+                        return existing
+                meta = await run_in_threadpool(
+                    self._commit, tmp, target_container, filename, content_type, size, hexdigest
+                )
+            return await self._result(target_container, meta, False)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _commit(self, tmp: str, container_name: str, filename: str, content_type: Optional[str],
+                size: int, sha256: str) -> Dict[str, Any]:
+        timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        blob_name = f"{timestamp}-{sha256[:12]}-{filename}"
+        meta = {
+            "name": blob_name,
+            "sha256": sha256,
+            "size": size,
+            "content_type": content_type,
+            "uploaded_at": timestamp,
+            "last_modified": time.time(),
+        }
+        object_path = self._object_path(container_name, sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(tmp, object_path)
+        if not os.path.exists(object_path + ".json"):
+            self._write_json(object_path + ".json", meta)
+        self._write_json(self._name_path(container_name, blob_name), meta)
+        self._bump_generation(container_name)
+        return meta
+
+    def _scan_names(self, container_name: str) -> List[str]:
+        names = []
+        for dirpath, _, filenames in os.walk(os.path.join(self._container_dir(container_name), "names")):
+            for filename in filenames:
+                if filename.endswith(".json"):
+                    meta = self._read_json(os.path.join(dirpath, filename))
+                    if meta is not None:
+                        names.append(meta["name"])
+        names.sort()
+        return names
+
+    async def _sorted_names(self, container_name: str) -> List[str]:
+        generation = self._generation(container_name)
+        cached = self._names.get(container_name)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        async with self._lock(container_name):
+            cached = self._names.get(container_name)
+            if cached is None or cached[0] != generation:
+                cached = self._names[container_name] = (generation, await run_in_threadpool(self._scan_names, container_name))
+            return cached[1]
+
+    async def list_page(self, page_size: int = 100, container_name: Optional[str] = None,
+                        continuation_token: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+        """One page in name order; the continuation token is the last name returned."""
+        target_container = container_name or self.container_name
+        names = await self._sorted_names(target_container)
+        prefix = prefix or ""
+        if continuation_token:
+            start = bisect.bisect_right(names, continuation_token)
+        else:
+            start = bisect.bisect_left(names, prefix)
+
+        files = []
+        for blob_name in names[start:]:
+            if not blob_name.startswith(prefix):
+                break
+            meta = await run_in_threadpool(self._read_json, self._name_path(target_container, blob_name))
+            if meta is None:
+                continue
+            files.append({
+                "name": blob_name,
+                "url": await self.blob_url(target_container, blob_name),
+                "content_type": meta.get("content_type"),
+                "size": meta["size"],
+                "last_modified": datetime.fromtimestamp(meta["last_modified"], timezone.utc).isoformat(),
+            })
+            if len(files) == page_size:
+                break
+
+        last = files[-1]["name"] if files else None
+        more = last is not None and bisect.bisect_right(names, last) < len(names) \
+            and names[bisect.bisect_right(names, last)].startswith(prefix)
+        return {"items": files, "continuation_token": last if more else None}
+
+    async def get_properties(self, container_name: str, blob_name: str) -> Optional[dict]:
+        meta = await run_in_threadpool(self._read_json, self._name_path(container_name, blob_name))
+        if meta is None:
+            return None
+        return {
+            # content-addressed objects never change, so the hash is a strong ETag
+            "etag": f'"{meta["sha256"]}"',
+            "size": meta["size"],
+            "content_type": meta.get("content_type"),
+            "last_modified": datetime.fromtimestamp(meta["last_modified"], timezone.utc),
+        }
+
+    async def get_range(self, container_name: str, blob_name: str, offset: int = 0,
+                        length: Optional[int] = None, etag: Optional[str] = None) -> AsyncIterator[bytes]:
+        meta = await run_in_threadpool(self._read_json, self._name_path(container_name, blob_name))
+        if meta is None:
+            raise FileNotFoundError(f"{container_name}/{blob_name}")
+        if etag and etag != f'"{meta["sha256"]}"':
+            raise ValueError(f"{container_name}/{blob_name} changed since ETag {etag}")
+        end = meta["size"] if length is None else min(meta["size"], offset + length)
+        if offset >= end:
+            return
+        with open(self._object_path(container_name, meta["sha256"]), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for pos in range(offset, end, self.read_chunk_size):
+                    yield view[pos:min(pos + self.read_chunk_size, end)]
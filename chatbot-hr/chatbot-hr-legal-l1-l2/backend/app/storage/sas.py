@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+from azure.storage.blob import (
+    generate_blob_sas,
+    generate_container_sas,
+    BlobSasPermissions,
+    ContainerSasPermissions,
+)
+
+
+class SasMinter:
+    """Read-only SAS URLs with token reuse.
+
+    Expiries are rounded up to SAS_WINDOW_SECONDS boundaries and a token is
+    reused until fewer than SAS_MIN_REMAINING_SECONDS remain, so listings sign
+    each blob (or container) at most once per window instead of per request.
+
+    SAS_MODE selects what is signed:
+      - ``blob``: one account-key token per blob (default)
+      - ``container``: one account-key token per container, shared by its blobs
+      - ``user_delegation``: container tokens signed with a cached user
+        delegation key; needs the Azure AD sign-in (AZURE_STORAGE_ACCOUNT_URL
+        without a connection string), and is the default there
+
+    With SAS_LAZY=1, ``listing_url`` returns a backend URL that mints the SAS
+    only when the client follows it.
+    """
+
+    def __init__(self, storage: Any):
+        self.storage = storage
+        signed_in = not storage.connection_string
+        self.mode = os.getenv("SAS_MODE", "user_delegation" if signed_in else "blob").lower()
+        if self.mode not in ("blob", "container", "user_delegation"):
+            raise ValueError(f"Unknown SAS_MODE '{self.mode}' (expected blob, container or user_delegation)")
+        if (self.mode == "user_delegation") != signed_in:
+            raise ValueError(
+                "SAS_MODE=user_delegation needs AZURE_STORAGE_ACCOUNT_URL (Azure AD sign-in) and no connection string"
+                if not signed_in else
+                f"SAS_MODE={self.mode} signs with the account key; without a connection string use user_delegation"
+            )
+        self.lazy = os.getenv("SAS_LAZY", "0") == "1"
+        self.lazy_prefix = os.getenv("SAS_LAZY_URL_PREFIX", "/api/files/sas").rstrip("/")
+        self.ttl = int(os.getenv("SAS_TTL_SECONDS", "3600"))
+        self.window = int(os.getenv("SAS_WINDOW_SECONDS", "900"))
+        self.min_remaining = int(os.getenv("SAS_MIN_REMAINING_SECONDS", "600"))
+        self.max_entries = int(os.getenv("SAS_CACHE_MAX_ENTRIES", "50000"))
+        self._tokens: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._delegation_key: Optional[Tuple[float, Any]] = None
+        self._delegation_lock = asyncio.Lock()
+        self.minted = 0
+        self.reused = 0
+
+    def _expiry(self, now: float) -> float:
+        # aligned so every token minted within a window shares the same expiry
+        return -(-(now + self.ttl) // self.window) * self.window
+
+    def base_url(self, container_name: str, blob_name: str) -> str:
+        account_url = self.storage.service_client.url.split("?", 1)[0].rstrip("/")
+        return f"{account_url}/{container_name}/{quote(blob_name)}"
+
+    def listing_url(self, container_name: str, blob_name: str) -> Optional[str]:
+        """URL to put in listings: the lazy endpoint, or None when a SAS must be minted now."""
+        if self.lazy:
+            return f"{self.lazy_prefix}/{container_name}/{quote(blob_name)}"
+        return None
+
+    async def url(self, container_name: str, blob_name: str) -> str:
+        return f"{self.base_url(container_name, blob_name)}?{await self.token(container_name, blob_name)}"
+
+    async def token(self, container_name: str, blob_name: str) -> str:
+        now = time.time()
+        key = (container_name, "" if self.mode != "blob" else blob_name)
+        entry = self._tokens.get(key)
+        if entry is not None and entry[0] - now >= self.min_remaining:
+            self._tokens.move_to_end(key)
+            self.reused += 1
+            return entry[1]
+
+        expiry = self._expiry(now)
+        expiry_dt = datetime.utcfromtimestamp(expiry)
+        if self.mode == "blob":
+            token = generate_blob_sas(
+                account_name=self.storage.account_name or self.storage.service_client.account_name,
+                container_name=container_name,
+                blob_name=blob_name,
+                account_key=self._account_key(),
+                permission=BlobSasPermissions(read=True),
+                expiry=expiry_dt,
+            )
+        elif self.mode == "container":
+            token = generate_container_sas(
+                account_name=self.storage.account_name or self.storage.service_client.account_name,
+                container_name=container_name,
+                account_key=self._account_key(),
+                permission=ContainerSasPermissions(read=True),
+                expiry=expiry_dt,
+            )
+        else:
+            token = generate_container_sas(
+                account_name=self.storage.account_name or self.storage.service_client.account_name,
+                container_name=container_name,
+                user_delegation_key=await self._user_delegation_key(now, expiry),
+                permission=ContainerSasPermissions(read=True),
+                expiry=expiry_dt,
+            )
+
+        self.minted += 1
+        self._tokens[key] = (expiry, token)
+        self._tokens.move_to_end(key)
+        while len(self._tokens) > self.max_entries:
+            self._tokens.popitem(last=False)
+        return token
+
+    def _account_key(self) -> Optional[str]:
+        return self.storage.account_key or getattr(self.storage.service_client.credential, 'account_key', None)
+
+    async def _user_delegation_key(self, now: float, expiry: float) -> Any:
+        async with self._delegation_lock:
+            cached = self._delegation_key
+            if cached is None or cached[0] < expiry:
+                # one key covers many token windows; the service allows up to 7 days
+                key_expiry = expiry + 6 * 3600
+                key = await self.storage.service_client.get_user_delegation_key(
+                    datetime.utcfromtimestamp(now - 300), datetime.utcfromtimestamp(key_expiry)
+                )
+                cached = self._delegation_key = (key_expiry, key)
+            return cached[1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "lazy": self.lazy,
+            "cached_tokens": len(self._tokens),
+            "minted": self.minted,
+            "reused": self.reused,
+        }
@@ -151,6 +151,7 @@ export default function App() {
 
 function FilesPanel({ selectedDomain = 'hr' }) {
   const [files, setFiles] = useState([]);
+  const [nextToken, setNextToken] = useState(null);
   const [loading, setLoading] = useState(false);
   const [fileDomain, setFileDomain] = useState(selectedDomain === 'auto' ? 'hr' : selectedDomain);
 
@@ -165,12 +166,16 @@ function FilesPanel({ selectedDomain = 'hr' }) {
     loadFiles();
   }, [fileDomain]);
 
-  async function loadFiles() {
+  async function loadFiles(token = null) {
     setLoading(true);
     try {
-      const res = await fetch(`/api/files/list?domain=${encodeURIComponent(fileDomain)}`);
+      let url = `/api/files/list?domain=${encodeURIComponent(fileDomain)}`;
+      if (token) url += `&continuation_token=${encodeURIComponent(token)}`;
+      const res = await fetch(url);
       const data = await res.json();
-      setFiles(data);
+      // a token means "next page": append instead of replacing
+      setFiles((prev) => (token ? [...prev, ...data.items] : data.items));
+      setNextToken(data.continuation_token);
     } catch (e) {
       console.error('Failed to load files', e);
     } finally {
@@ -230,6 +235,11 @@ function FilesPanel({ selectedDomain = 'hr' }) {
           ))}
         </div>
       )}
+      {nextToken && !loading && (
+        <button className="send-btn" style={{ marginTop: 12 }} onClick={() => loadFiles(nextToken)}>
+          Load more
+        </button>
+      )}
     </div>
   );
 }
@@ -0,0 +1,210 @@
+"""Batch version of docs.py: convert a directory or a blob container with Docling.
+
+Documents are converted in a process pool (one DocumentConverter per worker)
+and the Markdown/JSON output is cached on disk under
+``<cache>/<sha[:2]>/<sha256>-<docling version>.{md,json}``, so unchanged
+documents are never converted twice. Results are printed as JSON lines as
+soon as each document finishes.
+
+    python batch_convert.py ./policies --cache .docling-cache --workers 4
+    python batch_convert.py --container hrdocs --cache .docling-cache
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from importlib import metadata
+from typing import Dict, Iterator, Optional, Tuple
+
+SUPPORTED = (".pdf", ".docx", ".pptx", ".xlsx", ".html", ".htm", ".md", ".png", ".jpg", ".jpeg", ".tif", ".tiff")
+# bump when the cached output format changes
+OUTPUT_VERSION = "1"
+
+_converter = None
+_blob_service = None
+
+
+def converter_version() -> str:
+    try:
+        docling = metadata.version("docling")
+    except metadata.PackageNotFoundError:
+        docling = "unknown"
+    return f"docling{docling}-v{OUTPUT_VERSION}"
+
+
+def cache_paths(cache_dir: str, sha: str, version: str) -> Tuple[str, str]:
+    base = os.path.join(cache_dir, sha[:2], f"{sha}-{version}")
+    return base + ".md", base + ".json"
+
+
+def is_cached(cache_dir: str, sha: str, version: str) -> bool:
+    return all(os.path.exists(p) for p in cache_paths(cache_dir, sha, version))
+
+
+def sha256_file(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _get_converter():
+    # created lazily so workers that only see cache hits never load the models
+    global _converter
+    if _converter is None:
+        from docling.document_converter import DocumentConverter
+
+        _converter = DocumentConverter()
+    return _converter
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def convert_file(path: str, sha: str, cache_dir: str, version: str) -> Dict[str, str]:
+    """Worker: convert one local file and write its cache entries."""
+    md_path, json_path = cache_paths(cache_dir, sha, version)
+    if not is_cached(cache_dir, sha, version):
+        doc = _get_converter().convert(path).document
+        _write_atomic(md_path, doc.export_to_markdown())
+        _write_atomic(json_path, json.dumps(doc.export_to_dict(), ensure_ascii=False))
+    return {"sha256": sha, "markdown": md_path, "json": json_path}
+
+
+def _init_blob_worker(connection_string: str) -> None:
+    global _blob_service
+    from azure.storage.blob import BlobServiceClient
+
+    _blob_service = BlobServiceClient.from_connection_string(connection_string)
+
+
+def convert_blob(container: str, name: str, cache_dir: str, version: str) -> Dict[str, str]:
+    """Worker: download one blob, hash it, and convert it unless cached."""
+    suffix = os.path.splitext(name)[1]
+    fd, tmp = tempfile.mkstemp(suffix=suffix)
+    try:
+        h = hashlib.sha256()
+        with os.fdopen(fd, "wb") as f:
+            for chunk in _blob_service.get_blob_client(container, name).download_blob().chunks():
+                h.update(chunk)
+                f.write(chunk)
+        result = convert_file(tmp, h.hexdigest(), cache_dir, version)
+    finally:
+        os.remove(tmp)
+    return result
+
+
+def iter_directory(root: str) -> Iterator[str]:
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SUPPORTED):
+                yield os.path.join(dirpath, filename)
+
+
+def _load_manifest(path: str) -> Dict[str, str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _emit(record: Dict[str, str]) -> None:
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+def run_directory(root: str, cache_dir: str, workers: Optional[int]) -> int:
+    version = converter_version()
+    paths = list(iter_directory(root))
+    failures = 0
+    # hashing is I/O bound; do it in threads and only send cache misses to the process pool
+    with ThreadPoolExecutor(max_workers=8) as hashers:
+        hashes = dict(zip(paths, hashers.map(sha256_file, paths)))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for path, sha in hashes.items():
+            if is_cached(cache_dir, sha, version):
+                md_path, json_path = cache_paths(cache_dir, sha, version)
+                _emit({"source": path, "status": "cached", "sha256": sha, "markdown": md_path, "json": json_path})
+            else:
+                futures[pool.submit(convert_file, path, sha, cache_dir, version)] = path
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                _emit({"source": path, "status": "converted", **future.result()})
+            except Exception as e:
+                failures += 1
+                _emit({"source": path, "status": "error", "error": str(e)})
+    return failures
+
+
+def run_container(container: str, cache_dir: str, workers: Optional[int], prefix: Optional[str]) -> int:
+    from azure.storage.blob import BlobServiceClient
+
+    connection_string = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
+    version = converter_version()
+    # etag -> sha256 of already-downloaded blobs, so warm runs skip the download as well
+    manifest_path = os.path.join(cache_dir, f"manifest-{container}.json")
+    manifest = _load_manifest(manifest_path)
+    failures = 0
+
+    container_client = BlobServiceClient.from_connection_string(connection_string).get_container_client(container)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_blob_worker,
+                             initargs=(connection_string,)) as pool:
+        futures = {}
+        for blob in container_client.list_blobs(name_starts_with=prefix):
+            if not blob.name.lower().endswith(SUPPORTED):
+                continue
+            key = f"{blob.name}@{blob.etag}"
+            sha = manifest.get(key)
+            if sha and is_cached(cache_dir, sha, version):
+                md_path, json_path = cache_paths(cache_dir, sha, version)
+                _emit({"source": blob.name, "status": "cached", "sha256": sha, "markdown": md_path, "json": json_path})
+                continue
+            futures[pool.submit(convert_blob, container, blob.name, cache_dir, version)] = key
+        for future in as_completed(futures):
+            key = futures[future]
+            name = key.rsplit("@", 1)[0]
+            try:
+                result = future.result()
+                manifest[key] = result["sha256"]
+                _emit({"source": name, "status": "converted", **result})
+            except Exception as e:
+                failures += 1
+                _emit({"source": name, "status": "error", "error": str(e)})
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_atomic(manifest_path, json.dumps(manifest))
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert documents with Docling in parallel, with an on-disk cache")
+    parser.add_argument("source", nargs="?", help="directory to convert")
+    parser.add_argument("--container", help="convert blobs from this Azure container instead of a directory")
+    parser.add_argument("--prefix", help="only blobs whose name starts with this prefix")
+    parser.add_argument("--cache", default=".docling-cache", help="output/cache directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.container:
+        failures = run_container(args.container, args.cache, args.workers, args.prefix)
+    elif args.source:
+        failures = run_directory(args.source, args.cache, args.workers)
+    else:
+        parser.error("give a directory or --container")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import logging
+import functools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from .settings import Settings
+
+logger = logging.getLogger("personna_chatbot")
+
+Turn = Dict[str, Any]
+# (previous summary, turns to fold in) -> new summary
+Summarizer = Callable[[str, Sequence[Turn]], Awaitable[str]]
+
+# "Question:"/"Answer:" labels or chat role markers around every turn
+TURN_OVERHEAD = 8
+
+SUMMARY_INSTRUCTION = (
+    "Merge the new turns into the current summary of this conversation. Keep facts, names, "
+    "numbers, decisions and open questions; drop greetings. Reply with the summary only, "
+    "in at most {words} words."
+)
+
+
+class TokenCounter:
+    """Counts tokens with the target model's own tokenizer where possible.
+
+    ``hf_tokenizer`` (the Hugging Face model id, for flan-t5) is loaded with
+    transformers; otherwise tiktoken's encoding for the model name (or
+    cl100k_base) is used, and without either ~4 characters per token.
+    Loading may download from the Hugging Face hub, so it runs in a worker
+    thread (``start_loading``) and never blocks startup; until it is done
+    counts use the ~4 characters per token estimate.
+    """
+
+    def __init__(self, model: str, hf_tokenizer: Optional[str] = None):
+        self.model = model
+        self.hf_tokenizer = hf_tokenizer
+        self.kind: Optional[str] = None
+        self._encode: Optional[Callable[[str], int]] = None
+        self._loading: Optional[asyncio.Future] = None
+        self._exact = functools.lru_cache(maxsize=4096)(self._count)
+
+    def load(self) -> str:
+        if self._encode is not None:
+            return self.kind
+        if self.hf_tokenizer:
+            try:
+                from transformers import AutoTokenizer
+
+                hf = AutoTokenizer.from_pretrained(self.hf_tokenizer)
+                self._encode = lambda text: len(hf.encode(text, add_special_tokens=False))
+                self.kind = f"hf:{self.hf_tokenizer}"
+                return self.kind
+            except Exception as e:
+                logger.warning("Tokenizer %s unavailable (%s); trying tiktoken", self.hf_tokenizer, e)
+        try:
+            import tiktoken
+
+            try:
+                encoding = tiktoken.encoding_for_model(self.model.split("/")[-1])
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            self._encode = lambda text: len(encoding.encode(text, disallowed_special=()))
+            self.kind = f"tiktoken:{encoding.name}"
+        except ImportError:
+            self._encode = lambda text: len(text) // 4 + 1
+            self.kind = "chars/4"
+        return self.kind
+
+    def start_loading(self) -> None:
+        if self._encode is None and self._loading is None:
+            self._loading = asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    def _count(self, text: str) -> int:
+        return self._encode(text)
+
+    def count(self, text: str) -> int:
+        if self._encode is None:
+            return len(text) // 4 + 1
+        return self._exact(text)
+
+    def truncate(self, text: str, max_tokens: int, keep_end: bool = False) -> str:
+        """Shorten ``text`` to about ``max_tokens`` (cut proportionally, then re-counted)."""
+        for _ in range(3):
+            tokens = self.count(text)
+            if tokens <= max_tokens:
+                return text
+            keep = max(0, int(len(text) * max_tokens / tokens) - 1)
+            text = text[-keep:] if keep_end else text[:keep]
+        return text
+
+
+@functools.lru_cache(maxsize=16)
+def counter_for(model: str, hf_tokenizer: Optional[str] = None) -> TokenCounter:
+    """One counter per tokenizer, shared by provider objects across settings reloads."""
+    return TokenCounter(model, hf_tokenizer)
+
+
+def _text(turn: Turn) -> str:
+    return f"{turn.get('user', '')}\n{turn.get('assistant', '')}"
+
+
+def _prefix_hashes(turns: Sequence[Turn]) -> List[str]:
+    """hashes[i] identifies turns[:i + 1], so a summary is reused only for the exact same history."""
+    hashes, digest = [], b""
+    for turn in turns:
+        digest = hashlib.sha256(digest + _text(turn).encode("utf-8")).digest()
+        hashes.append(digest.hex())
+    return hashes
+
+
+def _first_sentence(text: str, max_chars: int = 160) -> str:
+    text = " ".join(str(text).split())
+    for end in (". ", "? ", "! "):
+        cut = text.find(end)
+        if 0 < cut < max_chars:
+            return text[:cut + 1]
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def _extract(turn: Turn) -> str:
+    # the cheap stand-in for a summary: first sentence of each side of the turn
+    parts = []
+    if turn.get("user"):
+        parts.append(f"User: {_first_sentence(turn['user'])}")
+    if turn.get("assistant"):
+        parts.append(f"Assistant: {_first_sentence(turn['assistant'])}")
+    return " ".join(parts)
+
+
+def format_turns(turns: Sequence[Turn]) -> str:
+    return "\n".join(
+        line for turn in turns
+        for line in (f"User: {turn.get('user', '')}", f"Assistant: {turn.get('assistant', '')}")
+        if not line.endswith(": ")
+    )
+
+
+class ContextBuilder:
+    """Fits the client-supplied history into each provider's token budget.
+
+    The current message and the newest turns that fit are sent verbatim.
+    Older turns are represented by a running summary. Summaries are cached by
+    a hash of the turns they cover, so the next request resending the same
+    history reuses them. With CONTEXT_SUMMARY_MODE=llm they are refreshed in
+    the background (every CONTEXT_SUMMARY_REFRESH_TURNS newly folded turns),
+    never on the request path. Folded turns the summary does not cover yet are
+    represented by their first sentences. Payload size and latency per turn
+    stay bounded however long the conversation gets.
+    """
+
+    def __init__(self):
+        self.summarizer: Optional[Summarizer] = None
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.builds = 0
+        self.trimmed = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _cached_summary(self, hashes: List[str]) -> Tuple[int, str]:
+        """(number of turns covered, summary) for the longest cached prefix."""
+        for i in range(len(hashes) - 1, -1, -1):
+            summary = self._summaries.get(hashes[i])
+            if summary is not None:
+                self._summaries.move_to_end(hashes[i])
+                return i + 1, summary
+        return 0, ""
+
+    def fit(self, message: str, history: Optional[List[Turn]], budget: int,
+            counter: TokenCounter, settings: Settings) -> Tuple[Optional[str], List[Turn]]:
+        """(summary or None, newest turns) that fit ``budget`` tokens together with ``message``."""
+        self.builds += 1
+        turns = [t for t in history or [] if isinstance(t, dict)]
+        if budget <= 0 or not turns:
+            return None, turns
+
+        summary_budget = min(settings.summary_max_tokens, budget // 4)
+        room = budget - counter.count(message) - TURN_OVERHEAD - summary_budget
+        kept, used = 0, 0
+        for turn in reversed(turns):
+            tokens = counter.count(_text(turn)) + TURN_OVERHEAD
+            if used + tokens > room:
+                break
+            kept, used = kept + 1, used + tokens
+        cut = len(turns) - kept
+        if cut == 0:
+            return None, turns
+
+        self.trimmed += 1
+        older = turns[:cut]
+        hashes = _prefix_hashes(older)
+        covered, summary = self._cached_summary(hashes)
+        if (settings.summary_mode == "llm" and self.summarizer is not None
+                and cut - covered >= min(settings.summary_refresh_turns, cut)):
+            self._schedule_refresh(older, hashes, covered, summary, counter, settings)
+
+        # folded turns the summary does not cover yet: newest first, as many as fit
+        left = summary_budget - (counter.count(summary) if summary else 0)
+        lines: List[str] = []
+        for turn in reversed(older[covered:]):
+            line = _extract(turn)
+            left -= counter.count(line) + 1
+            if left < 0:
+                break
+            lines.append(line)
+        text = "\n".join(([summary] if summary else []) + lines[::-1])
+        text = counter.truncate(text, summary_budget, keep_end=True)
+        return text or None, turns[cut:]
+
+    def _schedule_refresh(self, older: List[Turn], hashes: List[str], covered: int, summary: str,
+                          counter: TokenCounter, settings: Settings) -> None:
+        key = hashes[-1]
+        if key in self._refreshing or len(self._refreshing) >= settings.summary_concurrency:
+            return
+        self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh(older, hashes, covered, summary, counter, settings))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._refreshing.discard(key))
+
+    async def _refresh(self, older: List[Turn], hashes: List[str], covered: int, summary: str,
+                       counter: TokenCounter, settings: Settings) -> None:
+        """Fold ``older[covered:]`` into the summary, a bounded chunk of turns per call."""
+        while covered < len(older):
+            end, size = covered, 0
+            while end < len(older) and (end == covered or size + counter.count(_text(older[end])) <= settings.summary_input_tokens):
+                size += counter.count(_text(older[end]))
+                end += 1
+            try:
+                summary = await self.summarizer(summary, older[covered:end])
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.warning("Conversation summary refresh failed: %s", e)
+                return
+            summary = counter.truncate(summary.strip(), settings.summary_max_tokens)
+            covered = end
+            self._summaries[hashes[covered - 1]] = summary
+            self._summaries.move_to_end(hashes[covered - 1])
+            while len(self._summaries) > settings.summary_cache_max:
+                self._summaries.popitem(last=False)
+            self.refreshes += 1
+
+    @staticmethod
+    def summary_request(previous: str, turns: Sequence[Turn], settings: Settings) -> str:
+        # instruction last: seq2seq prompts that overflow are truncated from the left
+        instruction = SUMMARY_INSTRUCTION.format(words=int(settings.summary_max_tokens * 0.75))
+        return f"Current summary: {previous or '(none yet)'}\n\nNew turns:\n{format_turns(turns)}\n\n{instruction}"
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "builds": self.builds,
+            "trimmed": self.trimmed,
+            "cached_summaries": len(self._summaries),
+            "refreshing": len(self._refreshing),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
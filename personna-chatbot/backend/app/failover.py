@@ -0,0 +1,283 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from .providers import Provider, ProviderPool, Turn
+from .settings import Settings, SettingsStore
+
+logger = logging.getLogger("personna_chatbot")
+
+
+class RollingStats:
+    """Outcome and latency of the last ``window`` calls to one provider within ``max_age`` seconds.
+
+    Old samples age out, so a provider that was demoted for errors looks
+    healthy again once its failures are older than ``max_age`` and gets
+    retried.
+    """
+
+    def __init__(self, window: int, max_age: float):
+        self.samples: deque = deque(maxlen=window)
+        self.max_age = max_age
+        self.calls = 0
+        self.failures = 0
+
+    def configure(self, window: int, max_age: float) -> None:
+        if self.samples.maxlen != window:
+            self.samples = deque(self.samples, maxlen=window)
+        self.max_age = max_age
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.max_age
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.samples.append((time.monotonic(), latency, ok))
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+
+    def error_rate(self) -> float:
+        self._prune()
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, _, ok in self.samples if not ok) / len(self.samples)
+
+    def successes(self) -> int:
+        self._prune()
+        return sum(1 for _, _, ok in self.samples if ok)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency percentile of the successful calls in the window."""
+        self._prune()
+        latencies = sorted(latency for _, latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "window": len(self.samples),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down.
+
+    While open, calls are refused without touching the network. Half-open
+    lets one probe through: success closes the breaker, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow(self, settings: Settings, now: float) -> bool:
+        if self.state == self.OPEN:
+            if now - self.opened_at < settings.breaker_open_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def failure(self, settings: Settings, now: float) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= settings.breaker_failures:
+            if self.state != self.OPEN:
+                logger.warning("%s circuit opened after %d consecutive failures", self.name, self.consecutive_failures)
+            self.state = self.OPEN
+            self.opened_at = now
+        self.probe_in_flight = False
+
+    def release(self) -> None:
+        """A call ended without an outcome (cancelled); let another probe through."""
+        self.probe_in_flight = False
+
+    def to_dict(self, settings: Settings, now: float) -> Dict[str, Any]:
+        data = {"state": self.state, "consecutive_failures": self.consecutive_failures}
+        if self.state == self.OPEN:
+            data["retry_in_seconds"] = round(max(0.0, settings.breaker_open_seconds - (now - self.opened_at)), 1)
+        return data
+
+
+class AllProvidersFailed(Exception):
+    """No provider produced a reply; ``tried`` is empty when every circuit was open."""
+
+    def __init__(self, tried: List[str], errors: List[Exception]):
+        self.tried = tried
+        self.errors = errors
+        super().__init__(str(errors[-1]) if errors else "all provider circuits are open")
+
+
+class ProviderRouter:
+    """Sends each request to the healthiest configured provider.
+
+    Providers keep their configured order (PROVIDER_ORDER: OpenRouter, Hugging
+    Face, then the local model by default) unless one is unhealthy (breaker not closed, or error rate above
+    PROVIDER_MAX_ERROR_RATE), in which case it moves behind the healthy
+    ones. A provider whose breaker is open is skipped without waiting for its
+    timeout. With HEDGE_ENABLED, a request still running after the primary's
+    p95 latency is also sent to the next provider and the first reply wins.
+    Breakers and statistics are kept by provider name, so they survive
+    settings reloads.
+    """
+
+    def __init__(self, pool: ProviderPool, settings: SettingsStore):
+        self.pool = pool
+        self.settings = settings
+        self._stats: Dict[str, RollingStats] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def stats(self, name: str) -> RollingStats:
+        settings = self.settings.current
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = RollingStats(settings.stats_window, settings.stats_window_seconds)
+        stats.configure(settings.stats_window, settings.stats_window_seconds)
+        return stats
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def healthy(self, provider: Provider) -> bool:
+        return (self.breaker(provider.name).state == CircuitBreaker.CLOSED
+                and self.stats(provider.name).error_rate() <= self.settings.current.max_error_rate)
+
+    def ranked(self) -> List[Provider]:
+        chain = self.pool.chain()
+        return [p for p in chain if self.healthy(p)] + [p for p in chain if not self.healthy(p)]
+
+    async def _attempt(self, provider: Provider, message: str, history: Optional[List[Turn]]) -> str:
+        stats, breaker = self.stats(provider.name), self.breaker(provider.name)
+        started = time.monotonic()
+        try:
+            reply = await provider.generate(message, history)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            stats.record(time.monotonic() - started, False)
+            breaker.failure(self.settings.current, time.monotonic())
+            raise
+        stats.record(time.monotonic() - started, True)
+        breaker.success()
+        return reply
+
+    def _hedge_delay(self, provider: Provider, settings: Settings) -> Optional[float]:
+        if not settings.hedge:
+            return None
+        stats = self.stats(provider.name)
+        if stats.successes() < settings.hedge_min_samples:
+            return None
+        return max(stats.percentile(0.95), settings.hedge_min_delay_seconds)
+
+    async def generate(self, message: str, history: Optional[List[Turn]]) -> Tuple[str, str]:
+        """Return (reply, provider name); raises AllProvidersFailed."""
+        settings = self.settings.current
+        candidates = iter(self.ranked())
+        tried: List[str] = []
+        errors: List[Exception] = []
+
+        def next_allowed() -> Optional[Provider]:
+            for provider in candidates:
+                if self.breaker(provider.name).allow(settings, time.monotonic()):
+                    tried.append(provider.name)
+                    return provider
+            return None
+
+        primary = next_allowed()
+        while primary is not None:
+            running: Dict[asyncio.Task, Provider] = {
+                asyncio.ensure_future(self._attempt(primary, message, history)): primary
+            }
+            try:
+                delay = self._hedge_delay(primary, settings)
+                if delay is not None:
+                    done, _ = await asyncio.wait(set(running), timeout=delay)
+                    if not done:
+                        secondary = next_allowed()
+                        if secondary is not None:
+                            self.hedged += 1
+                            logger.info("Hedging %s after %.0f ms with %s", primary.name, delay * 1000, secondary.name)
+                            running[asyncio.ensure_future(self._attempt(secondary, message, history))] = secondary
+                pending = set(running)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if running[task] is not primary:
+                                self.hedge_wins += 1
+                            return task.result(), running[task].name
+                        logger.warning("%s error: %s", running[task].name, task.exception())
+                        errors.append(task.exception())
+            finally:
+                for task in running:
+                    if not task.done():
+                        task.cancel()
+            primary = next_allowed()
+
+        raise AllProvidersFailed(tried, errors)
+
+    async def generate_background(self, message: str) -> Tuple[str, str]:
+        """Like ``generate`` for background work (conversation summaries), without side effects.
+
+        No hedging, and nothing is recorded: long summary prompts must not skew
+        the latency window behind the hedge delay or move breakers. Providers
+        whose breaker is not closed are skipped, so user traffic keeps any
+        half-open probe.
+        """
+        tried: List[str] = []
+        errors: List[Exception] = []
+        for provider in self.ranked():
+            if self.breaker(provider.name).state != CircuitBreaker.CLOSED:
+                continue
+            tried.append(provider.name)
+            try:
+                return await provider.generate(message, None), provider.name
+            except Exception as e:
+                errors.append(e)
+        raise AllProvidersFailed(tried, errors)
+
+    def state(self) -> List[Dict[str, Any]]:
+        """Live per-provider state for /health."""
+        settings, now = self.settings.current, time.monotonic()
+        return [
+            {
+                "name": provider.name,
+                "model": provider.model,
+                "healthy": self.healthy(provider),
+                "breaker": self.breaker(provider.name).to_dict(settings, now),
+                **self.stats(provider.name).to_dict(),
+                **({"engine": provider.engine_stats()} if provider.engine_stats() is not None else {}),
+            }
+            for provider in self.ranked()
+        ]
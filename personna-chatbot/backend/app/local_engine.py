@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("personna_chatbot")
+
+
+def default_threads() -> int:
+    """Intra-op threads per worker: the cores divided between the uvicorn workers."""
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+class LocalSeq2SeqEngine:
+    """A seq2seq model (flan-t5-small by default) loaded once per worker, with dynamic micro-batching.
+
+    Concurrent ``generate`` calls are queued; a single batching task takes the
+    first waiting prompt, collects more for up to ``max_wait_ms`` or until
+    ``max_batch`` prompts, and runs one padded ``model.generate`` for all of
+    them on a dedicated inference thread. torch and transformers are imported
+    when the model loads, not at app import.
+    """
+
+    def __init__(self, model_name: str, max_batch: int = 8, max_wait_ms: float = 10.0,
+                 threads: int = 0, max_input_tokens: int = 512, max_new_tokens: int = 128):
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.threads = threads or default_threads()
+        self.max_input_tokens = max_input_tokens
+        self.max_new_tokens = max_new_tokens
+        self.tokenizer = None
+        self.model = None
+        self.load_error: Optional[BaseException] = None
+        # one inference thread: torch parallelises each batch across `threads` cores itself
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-model")
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.prompts = 0
+        self.busy_seconds = 0.0
+
+    def _load(self) -> None:
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already set (only allowed once per process)
+        started = time.perf_counter()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # if a prompt is still too long, drop the oldest context rather than the question
+        self.tokenizer.truncation_side = "left"
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
+        self.model.eval()
+        logger.info("Loaded local model %s in %.1f s (%d threads)",
+                    self.model_name, time.perf_counter() - started, self.threads)
+
+    async def start(self) -> None:
+        """Start batching and load the model in the background; calls wait until it is ready."""
+        if self._batcher is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("local model engine closed"))
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def generate(self, prompt: str) -> str:
+        if self._batcher is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, future))
+        return await future
+
+    def _generate_batch(self, prompts: List[str]) -> List[str]:
+        import torch
+
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True,
+                                max_length=self.max_input_tokens)
+        with torch.inference_mode():
+            output = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+        return self.tokenizer.batch_decode(output, skip_special_tokens=True)
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # callers that gave up (hedged or disconnected) do not take a batch slot
+        return [(prompt, future) for prompt, future in batch if not future.done()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._load)
+        except Exception as e:
+            logger.exception("Failed to load local model %s", self.model_name)
+            self.load_error = e
+
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            if self.load_error is not None:
+                for _, future in batch:
+                    future.set_exception(RuntimeError(f"local model unavailable: {self.load_error}"))
+                continue
+            started = time.perf_counter()
+            try:
+                replies = await loop.run_in_executor(self._executor, self._generate_batch, [p for p, _ in batch])
+            except Exception as e:
+                logger.exception("Local batch of %d failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.busy_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.prompts += len(batch)
+            for (_, future), reply in zip(batch, replies):
+                if not future.done():
+                    future.set_result(reply)
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "ready": self.ready,
+            "load_error": str(self.load_error) if self.load_error else None,
+            "threads": self.threads,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "prompts": self.prompts,
+            "avg_batch_size": round(self.prompts / self.batches, 2) if self.batches else None,
+            "busy_seconds": round(self.busy_seconds, 2),
+        }
+
+
+# one engine per model and batching config, reference-counted so provider objects rebuilt
+# by a settings reload keep the loaded model instead of loading it again
+_engines: Dict[tuple, Tuple[LocalSeq2SeqEngine, int]] = {}
+
+
+def acquire_engine(model_name: str, **options: Any) -> LocalSeq2SeqEngine:
+    key = (model_name, tuple(sorted(options.items())))
+    engine, refs = _engines.get(key) or (LocalSeq2SeqEngine(model_name, **options), 0)
+    _engines[key] = (engine, refs + 1)
+    return engine
+
+
+async def release_engine(engine: LocalSeq2SeqEngine) -> None:
+    for key, (candidate, refs) in list(_engines.items()):
+        if candidate is engine:
+            if refs > 1:
+                _engines[key] = (engine, refs - 1)
+                return
+            del _engines[key]
+            await engine.close()
+            return
@@ -1,20 +1,33 @@
-import os
-import requests
+import asyncio
+import logging
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from .context import ContextBuilder
+from .failover import AllProvidersFailed, ProviderRouter
+from .providers import ProviderPool
+from .settings import SettingsStore
+
+# .env is read once here and re-read when the file changes (see SettingsStore)
+settings = SettingsStore()
+# history trimmed to each provider's token budget; older turns folded into cached summaries
+context = ContextBuilder()
+providers = ProviderPool(settings.current, context)
+settings.on_change(providers.reconfigure)
+# circuit breakers, rolling latency/error stats and optional hedging across the providers
+router = ProviderRouter(providers, settings)
+
+
+async def _summarize(previous: str, turns: list) -> str:
+    # background only (see ContextBuilder); the healthiest provider, kept out of its request stats
+    reply, _ = await router.generate_background(context.summary_request(previous, turns, settings.current))
+    return reply
 
-# Load environment variables from a .env file if present (but read values at runtime)
-load_dotenv()
 
-# Default models (actual keys are read at request time so changes take effect without restart)
-DEFAULT_HF_MODEL = os.getenv("HF_MODEL", "google/flan-t5-small")
-DEFAULT_OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "gpt-4o-mini")
+context.summarizer = _summarize
 
 app = FastAPI(title="Personna Chatbot API")
 
-import logging
 logger = logging.getLogger("personna_chatbot")
 logging.basicConfig(level=logging.INFO)
 
@@ -35,131 +48,74 @@ class ChatResponse(BaseModel):
     reply: str
 
 
+_settings_watcher: asyncio.Task | None = None
+
+
+@app.on_event("startup")
+async def start_providers():
+    global _settings_watcher
+    await providers.start()
+    _settings_watcher = asyncio.create_task(settings.watch())
+
+
+@app.on_event("shutdown")
+async def stop_providers():
+    if _settings_watcher is not None:
+        _settings_watcher.cancel()
+    await context.close()
+    await providers.close()
+
+
+def _dev_reply(message: str) -> ChatResponse:
+    return ChatResponse(reply=f"You said: '{message}'. How can I help?")
+
+
 @app.get("/health")
-def health():
-    """Return which model provider is active (openrouter, huggingface, or dev)."""
-    openrouter_key = os.getenv("OPENROUTER_API_KEY")
-    hf_token = os.getenv("HF_API_TOKEN")
-    dev_fb = os.getenv("DEV_FALLBACK", "true").lower() in ("1", "true", "yes")
-    if openrouter_key:
-        return {"status": "ok", "provider": "openrouter", "model": os.getenv("OPENROUTER_MODEL", DEFAULT_OPENROUTER_MODEL)}
-    if hf_token:
-        return {"status": "ok", "provider": "huggingface", "model": os.getenv("HF_MODEL", DEFAULT_HF_MODEL)}
-    return {"status": "ok", "provider": "dev-fallback" if dev_fb else "none"}
+async def health():
+    """Active provider (openrouter, huggingface, local, or dev) plus live breaker and latency state per provider."""
+    ranked = router.ranked()
+    if ranked:
+        status = "ok" if router.healthy(ranked[0]) else "degraded"
+        return {
+            "status": status,
+            "provider": ranked[0].name,
+            "model": ranked[0].model,
+            "providers": router.state(),
+            "hedging": {"enabled": settings.current.hedge, "hedged": router.hedged, "secondary_wins": router.hedge_wins},
+            "context": context.stats(),
+        }
+    return {"status": "ok", "provider": "dev-fallback" if settings.current.dev_fallback else "none", "providers": []}
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    # Build prompt using instruction format
-    prompt_parts = []
-    for turn in req.history or []:
-        user = turn.get("user", "")
-        assistant = turn.get("assistant", "")
-        if user:
-            prompt_parts.append(f"Question: {user}")
-        if assistant:
-            prompt_parts.append(f"Answer: {assistant}")
-    prompt_parts.append(f"Question: {req.message}")
-    prompt_parts.append("Answer:")
-    prompt = "\n".join(prompt_parts)
-
-    # Read provider config at request time so env var changes are picked up without restarting
-    openrouter_key = os.getenv("OPENROUTER_API_KEY")
-    openrouter_model = os.getenv("OPENROUTER_MODEL", DEFAULT_OPENROUTER_MODEL)
-    hf_token = os.getenv("HF_API_TOKEN")
-    hf_model = os.getenv("HF_MODEL", DEFAULT_HF_MODEL)
-    dev_fallback_enabled = os.getenv("DEV_FALLBACK", "true").lower() in ("1", "true", "yes")
-
-    # Prefer OpenRouter if configured
-    if openrouter_key:
-        try:
-            # build messages from history
-            messages = []
-            for turn in req.history or []:
-                if turn.get('user'):
-                    messages.append({"role": "user", "content": turn.get('user')})
-                if turn.get('assistant'):
-                    messages.append({"role": "assistant", "content": turn.get('assistant')})
-            # append current user message
-            messages.append({"role": "user", "content": req.message})
-
-            or_headers = {"Authorization": f"Bearer {openrouter_key}", "Content-Type": "application/json"}
-            or_payload = {"model": openrouter_model, "messages": messages}
-            logger.info("Calling OpenRouter model=%s", openrouter_model)
-            r = requests.post("https://api.openrouter.ai/v1/chat/completions", headers=or_headers, json=or_payload, timeout=60)
-            try:
-                r.raise_for_status()
-            except Exception as e:
-                # include response body in log for debugging
-                body = None
-                try:
-                    body = r.text
-                except Exception:
-                    body = "<could not read body>"
-                logger.error("OpenRouter call failed: %s; status=%s body=%s", e, r.status_code, body)
-                raise
-            data = r.json()
-            # OpenRouter follows chat completions shape similar to OpenAI
-            reply = None
-            if isinstance(data, dict) and "choices" in data and len(data["choices"]) > 0:
-                choice = data["choices"][0]
-                # some providers nest the message
-                if isinstance(choice.get("message"), dict) and "content" in choice.get("message"):
-                    reply = choice["message"]["content"]
-                elif "text" in choice:
-                    reply = choice["text"]
-            if reply is None:
-                reply = str(data)
-            return ChatResponse(reply=reply)
-        except Exception as e:
-            # if OpenRouter fails and HF_TOKEN exists, fall back to HF
-            if not hf_token:
-                # If dev fallback is enabled, return a friendly dev reply instead of hard failing
-                if dev_fallback_enabled:
-                    logger.warning("OpenRouter error and no HF token, returning dev-fallback: %s", e)
-                    return ChatResponse(reply=f"You said: '{req.message}'. How can I help?")
-                raise HTTPException(status_code=502, detail=f"OpenRouter error and no Hugging Face token to fall back: {e}")
-            # else continue to HF handling
-
-    # Fallback to Hugging Face Inference API if OpenRouter not configured or failed
-    if not hf_token:
-        # if no HF token and dev fallback is allowed, return dev responder
-        if dev_fallback_enabled:
-            logger.info("No HF token configured, returning dev-fallback reply")
-            return ChatResponse(reply=f"You said: '{req.message}'. How can I help?")
-        raise HTTPException(status_code=503, detail="No model API configured (set OPENROUTER_API_KEY or HF_API_TOKEN).")
-
-    headers = {
-        "Authorization": f"Bearer {hf_token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "inputs": prompt,
-        "options": {"wait_for_model": True}
-    }
+async def chat(req: ChatRequest):
+    config = settings.current
+
+    if not providers.chain():
+        # if no provider is configured and dev fallback is allowed, return dev responder
+        if config.dev_fallback:
+            logger.info("No model API configured, returning dev-fallback reply")
+            return _dev_reply(req.message)
+        raise HTTPException(
+            status_code=503, detail="No model API configured (set OPENROUTER_API_KEY, HF_API_TOKEN or LOCAL_MODEL_ENABLED)."
+        )
 
+    # healthiest provider first (PROVIDER_ORDER, unless one is failing)
     try:
-        response = requests.post(
-            f"https://api-inference.huggingface.co/models/{hf_model}",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        response.raise_for_status()
-        result = response.json()
-
-        # Extract reply
-        if isinstance(result, dict) and "generated_text" in result:
-            reply = result["generated_text"]
-        elif isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict) and "generated_text" in result[0]:
-            reply = result[0]["generated_text"]
-        else:
-            reply = str(result)
-
-    except Exception as e:
-        # if dev fallback allowed, return friendly reply
-        if dev_fallback_enabled:
-            logger.warning("Hugging Face API error, returning dev-fallback: %s", e)
-            return ChatResponse(reply=f"You said: '{req.message}'. How can I help?")
-        raise HTTPException(status_code=500, detail=f"Hugging Face API error: {e}")
-
-    return ChatResponse(reply=reply)
+        reply, _ = await router.generate(req.message, req.history)
+        return ChatResponse(reply=reply)
+    except AllProvidersFailed as e:
+        error = e
+
+    # if dev fallback allowed, return friendly reply
+    if config.dev_fallback:
+        logger.warning("All model providers failed, returning dev-fallback: %s", error)
+        return _dev_reply(req.message)
+    if not error.tried:
+        raise HTTPException(status_code=503, detail="All model providers are unavailable (circuit open); retry later.")
+    if error.tried[-1] == "local":
+        raise HTTPException(status_code=500, detail=f"Local model error: {error}")
+    if error.tried[-1] == "huggingface":
+        raise HTTPException(status_code=500, detail=f"Hugging Face API error: {error}")
+    if config.hf_api_token:
+        raise HTTPException(status_code=502, detail=f"OpenRouter error and Hugging Face unavailable: {error}")
+    raise HTTPException(status_code=502, detail=f"OpenRouter error and no Hugging Face token to fall back: {error}")
@@ -0,0 +1,343 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+import httpx
+from .context import ContextBuilder, TokenCounter, counter_for
+from .local_engine import acquire_engine, release_engine
+from .settings import Settings
+
+logger = logging.getLogger("personna_chatbot")
+
+Turn = Dict[str, Any]
+
+
+class ProviderError(Exception):
+    """An upstream provider call failed (transport error, bad status or unusable body)."""
+
+
+def build_prompt(message: str, history: Optional[List[Turn]], summary: Optional[str] = None) -> str:
+    """Instruction-style prompt for text2text models."""
+    prompt_parts = []
+    if summary:
+        prompt_parts.append(f"Earlier conversation: {summary}")
+    for turn in history or []:
+        user = turn.get("user", "")
+        assistant = turn.get("assistant", "")
+        if user:
+            prompt_parts.append(f"Question: {user}")
+        if assistant:
+            prompt_parts.append(f"Answer: {assistant}")
+    prompt_parts.append(f"Question: {message}")
+    prompt_parts.append("Answer:")
+    return "\n".join(prompt_parts)
+
+
+def build_messages(message: str, history: Optional[List[Turn]], summary: Optional[str] = None) -> List[Dict[str, str]]:
+    """Chat-completions messages from the history plus the current user message."""
+    messages = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    for turn in history or []:
+        if turn.get('user'):
+            messages.append({"role": "user", "content": turn.get('user')})
+        if turn.get('assistant'):
+            messages.append({"role": "assistant", "content": turn.get('assistant')})
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+class Provider:
+    """One upstream model API with its own keep-alive connection pool.
+
+    The pool size (PROVIDER_MAX_CONNECTIONS) is the provider's concurrency
+    limit: further calls wait for a free connection instead of a thread.
+    History is fitted to ``context_tokens`` (counted with the model's
+    tokenizer) by the shared ContextBuilder before each call.
+    """
+
+    name = "base"
+    # settings baked in at start() (client, tokenizer); a reload that changes one rebuilds the
+    # provider, any other change is picked up in place (the rest are read per call)
+    rebuild_on: Tuple[str, ...] = ("timeout_seconds", "max_connections", "max_keepalive")
+
+    def __init__(self, settings: Settings, context: Optional[ContextBuilder] = None):
+        self.settings = settings
+        self.context = context
+        self.client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @property
+    def model(self) -> Optional[str]:
+        return None
+
+    def engine_stats(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    @property
+    def context_tokens(self) -> int:
+        return self.settings.context_max_tokens
+
+    @property
+    def counter(self) -> TokenCounter:
+        return counter_for(self.model or "")
+
+    def _fit(self, message: str, history: Optional[List[Turn]]) -> Tuple[Optional[str], Optional[List[Turn]]]:
+        """(summary of the folded turns, newest turns) within this provider's token budget."""
+        if self.context is None:
+            return None, history
+        return self.context.fit(message, history, self.context_tokens, self.counter, self.settings)
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json"}
+
+    def _base_url(self) -> str:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        if self.client is None and self.configured:
+            self.client = httpx.AsyncClient(
+                base_url=self._base_url(),
+                headers=self._headers(),
+                timeout=httpx.Timeout(self.settings.timeout_seconds, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.settings.max_connections,
+                    max_keepalive_connections=self.settings.max_keepalive,
+                ),
+            )
+            self.counter.start_loading()
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Any:
+        if self.client is None:
+            await self.start()
+        try:
+            r = await self.client.post(path, json=payload)
+        except httpx.HTTPError as e:
+            raise ProviderError(f"{self.name} request failed: {e!r}") from e
+        if r.is_error:
+            # include response body in log for debugging
+            logger.error("%s call failed: status=%s body=%s", self.name, r.status_code, r.text[:2000])
+            raise ProviderError(f"{self.name} returned HTTP {r.status_code}")
+        try:
+            return r.json()
+        except ValueError as e:
+            raise ProviderError(f"{self.name} returned invalid JSON") from e
+
+    async def generate(self, message: str, history: Optional[List[Turn]]) -> str:
+        raise NotImplementedError
+
+
+class OpenRouterProvider(Provider):
+    name = "openrouter"
+    rebuild_on = Provider.rebuild_on + ("openrouter_api_key", "openrouter_url", "openrouter_model")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.settings.openrouter_api_key)
+
+    @property
+    def model(self) -> str:
+        return self.settings.openrouter_model
+
+    def _base_url(self) -> str:
+        return self.settings.openrouter_url
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.settings.openrouter_api_key}", "Content-Type": "application/json"}
+
+    async def generate(self, message: str, history: Optional[List[Turn]]) -> str:
+        summary, history = self._fit(message, history)
+        payload = {"model": self.model, "messages": build_messages(message, history, summary)}
+        logger.info("Calling OpenRouter model=%s", self.model)
+        data = await self._post("/chat/completions", payload)
+        # OpenRouter follows chat completions shape similar to OpenAI
+        reply = None
+        if isinstance(data, dict) and "choices" in data and len(data["choices"]) > 0:
+            choice = data["choices"][0]
+            # some providers nest the message
+            if isinstance(choice.get("message"), dict) and "content" in choice.get("message"):
+                reply = choice["message"]["content"]
+            elif "text" in choice:
+                reply = choice["text"]
+        return reply if reply is not None else str(data)
+
+
+class HuggingFaceProvider(Provider):
+    name = "huggingface"
+    rebuild_on = Provider.rebuild_on + ("hf_api_token", "hf_url", "hf_model")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.settings.hf_api_token)
+
+    @property
+    def model(self) -> str:
+        return self.settings.hf_model
+
+    def _base_url(self) -> str:
+        return self.settings.hf_url
+
+    @property
+    def context_tokens(self) -> int:
+        return self.settings.seq2seq_context_tokens
+
+    @property
+    def counter(self) -> TokenCounter:
+        return counter_for(self.model, self.model)
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.settings.hf_api_token}", "Content-Type": "application/json"}
+
+    async def generate(self, message: str, history: Optional[List[Turn]]) -> str:
+        summary, history = self._fit(message, history)
+        payload = {"inputs": build_prompt(message, history, summary), "options": {"wait_for_model": True}}
+        result = await self._post(f"/models/{self.model}", payload)
+        if isinstance(result, dict) and "generated_text" in result:
+            return result["generated_text"]
+        if isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict) and "generated_text" in result[0]:
+            return result[0]["generated_text"]
+        return str(result)
+
+
+class LocalProvider(Provider):
+    """flan-t5 (LOCAL_MODEL) running in this worker on CPU; no HTTP client.
+
+    Concurrent prompts are micro-batched by the shared engine (see
+    local_engine). The model starts loading in the background at startup;
+    calls made before it is ready wait, bounded by PROVIDER_TIMEOUT_SECONDS.
+    """
+
+    name = "local"
+    rebuild_on = ("local_model_enabled", "local_model", "local_max_batch", "local_max_wait_ms",
+                  "local_threads", "local_max_new_tokens")
+
+    def __init__(self, settings: Settings, context: Optional[ContextBuilder] = None):
+        super().__init__(settings, context)
+        self.engine = None
+
+    @property
+    def configured(self) -> bool:
+        return self.settings.local_model_enabled
+
+    @property
+    def model(self) -> str:
+        return self.settings.local_model
+
+    def engine_stats(self) -> Optional[Dict[str, Any]]:
+        return self.engine.stats() if self.engine is not None else None
+
+    @property
+    def context_tokens(self) -> int:
+        return self.settings.seq2seq_context_tokens
+
+    @property
+    def counter(self) -> TokenCounter:
+        return counter_for(self.model, self.model)
+
+    async def start(self) -> None:
+        if self.engine is None and self.configured:
+            self.engine = acquire_engine(
+                self.settings.local_model,
+                max_batch=self.settings.local_max_batch,
+                max_wait_ms=self.settings.local_max_wait_ms,
+                threads=self.settings.local_threads,
+                max_new_tokens=self.settings.local_max_new_tokens,
+            )
+            await self.engine.start()
+            self.counter.start_loading()
+
+    async def close(self) -> None:
+        if self.engine is not None:
+            engine, self.engine = self.engine, None
+            await release_engine(engine)
+
+    async def generate(self, message: str, history: Optional[List[Turn]]) -> str:
+        if self.engine is None:
+            await self.start()
+        summary, history = self._fit(message, history)
+        try:
+            return await asyncio.wait_for(
+                self.engine.generate(build_prompt(message, history, summary)), self.settings.timeout_seconds
+            )
+        except asyncio.TimeoutError as e:
+            raise ProviderError(f"local model did not answer within {self.settings.timeout_seconds:g} s") from e
+        except Exception as e:
+            raise ProviderError(f"local model failed: {e}") from e
+
+
+PROVIDER_TYPES = (OpenRouterProvider, HuggingFaceProvider, LocalProvider)
+
+
+class ProviderPool:
+    """The configured providers, in preference order, with their HTTP clients.
+
+    Clients are opened at startup. A reload rebuilds only the providers whose
+    client settings (``rebuild_on``) changed, so the others keep their warm
+    connections; replaced clients are closed after the call timeout so
+    requests already using them can finish.
+    """
+
+    def __init__(self, settings: Settings, context: Optional[ContextBuilder] = None):
+        self.settings = settings
+        self.context = context
+        self.providers: Dict[str, Provider] = {cls.name: cls(settings, context) for cls in PROVIDER_TYPES}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def chain(self) -> List[Provider]:
+        """Configured providers in PROVIDER_ORDER; names not listed there are not used."""
+        ordered = (self.providers.get(name) for name in self.settings.provider_order)
+        return [p for p in ordered if p is not None and p.configured]
+
+    async def start(self) -> None:
+        for provider in self.providers.values():
+            await provider.start()
+
+    async def close(self) -> None:
+        # pending delayed closes close their providers when cancelled
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for provider in self.providers.values():
+            await provider.close()
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        # the loop only keeps weak references to tasks; hold them until they finish
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Provider reconfiguration task failed: %r", task.exception())
+
+    def reconfigure(self, old: Settings, new: Settings) -> None:
+        """Settings listener: rebuild providers whose client settings changed, update the rest in place."""
+        self.settings = new
+        changed = set(new.changed(old))
+        retired: List[Provider] = []
+        for name, provider in list(self.providers.items()):
+            if changed.intersection(provider.rebuild_on):
+                replacement = self.providers[name] = type(provider)(new, self.context)
+                retired.append(provider)
+                self._spawn(replacement.start())
+            else:
+                provider.settings = new
+        if retired:
+            logger.info("Rebuilt providers after a settings change: %s", ", ".join(p.name for p in retired))
+            self._spawn(self._close_later(retired, old.timeout_seconds))
+
+    @staticmethod
+    async def _close_later(providers: List[Provider], delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            for provider in providers:
+                await provider.close()
@@ -0,0 +1,168 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass, fields
+from typing import Callable, List, Optional, Tuple
+from dotenv import dotenv_values, find_dotenv
+
+logger = logging.getLogger("personna_chatbot")
+
+
+def _flag(value: Optional[str], default: bool) -> bool:
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Provider configuration snapshot; a new one is built whenever ``.env`` changes."""
+
+    openrouter_api_key: Optional[str] = None
+    openrouter_model: str = "gpt-4o-mini"
+    openrouter_url: str = "https://api.openrouter.ai/v1"
+    hf_api_token: Optional[str] = None
+    hf_model: str = "google/flan-t5-small"
+    hf_url: str = "https://api-inference.huggingface.co"
+    dev_fallback: bool = True
+    # per upstream call, and per provider: open connections (= concurrent calls) and idle keep-alive
+    timeout_seconds: float = 60.0
+    max_connections: int = 64
+    max_keepalive: int = 16
+    # failover: breaker opens after N consecutive failures and probes again after open_seconds
+    breaker_failures: int = 5
+    breaker_open_seconds: float = 30.0
+    stats_window: int = 200
+    stats_window_seconds: float = 60.0
+    max_error_rate: float = 0.5
+    # hedging: after the primary's p95 latency, also ask the next provider and take the first reply
+    hedge: bool = False
+    hedge_min_samples: int = 20
+    hedge_min_delay_seconds: float = 0.2
+    # in-process CPU model (LocalProvider): loaded once per worker, prompts micro-batched
+    local_model_enabled: bool = False
+    local_model: str = "google/flan-t5-small"
+    local_max_batch: int = 8
+    local_max_wait_ms: float = 10.0
+    local_threads: int = 0  # 0 = cores / WEB_CONCURRENCY
+    local_max_new_tokens: int = 128
+    # history budget per request (chat models / flan-t5, whose input is 512 tokens) and rolling summary
+    context_max_tokens: int = 4000
+    seq2seq_context_tokens: int = 480
+    summary_mode: str = "llm"  # or "extractive"
+    summary_max_tokens: int = 300
+    summary_refresh_turns: int = 6
+    summary_input_tokens: int = 2000
+    summary_concurrency: int = 2
+    summary_cache_max: int = 2048
+    # preference order of the configured providers
+    provider_order: Tuple[str, ...] = ("openrouter", "huggingface", "local")
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        env = os.environ
+        return cls(
+            openrouter_api_key=env.get("OPENROUTER_API_KEY") or None,
+            openrouter_model=env.get("OPENROUTER_MODEL", cls.openrouter_model),
+            openrouter_url=env.get("OPENROUTER_BASE_URL", cls.openrouter_url).rstrip("/"),
+            hf_api_token=env.get("HF_API_TOKEN") or None,
+            hf_model=env.get("HF_MODEL", cls.hf_model),
+            hf_url=env.get("HF_BASE_URL", cls.hf_url).rstrip("/"),
+            dev_fallback=_flag(env.get("DEV_FALLBACK"), True),
+            timeout_seconds=float(env.get("PROVIDER_TIMEOUT_SECONDS", cls.timeout_seconds)),
+            max_connections=int(env.get("PROVIDER_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive=int(env.get("PROVIDER_MAX_KEEPALIVE", cls.max_keepalive)),
+            breaker_failures=int(env.get("BREAKER_FAILURES", cls.breaker_failures)),
+            breaker_open_seconds=float(env.get("BREAKER_OPEN_SECONDS", cls.breaker_open_seconds)),
+            stats_window=int(env.get("PROVIDER_STATS_WINDOW", cls.stats_window)),
+            stats_window_seconds=float(env.get("PROVIDER_STATS_WINDOW_SECONDS", cls.stats_window_seconds)),
+            max_error_rate=float(env.get("PROVIDER_MAX_ERROR_RATE", cls.max_error_rate)),
+            hedge=_flag(env.get("HEDGE_ENABLED"), cls.hedge),
+            hedge_min_samples=int(env.get("HEDGE_MIN_SAMPLES", cls.hedge_min_samples)),
+            hedge_min_delay_seconds=float(env.get("HEDGE_MIN_DELAY_MS", cls.hedge_min_delay_seconds * 1000)) / 1000,
+            local_model_enabled=_flag(env.get("LOCAL_MODEL_ENABLED"), cls.local_model_enabled),
+            local_model=env.get("LOCAL_MODEL", cls.local_model),
+            local_max_batch=int(env.get("LOCAL_MAX_BATCH", cls.local_max_batch)),
+            local_max_wait_ms=float(env.get("LOCAL_MAX_WAIT_MS", cls.local_max_wait_ms)),
+            local_threads=int(env.get("LOCAL_TORCH_THREADS", cls.local_threads)),
+            local_max_new_tokens=int(env.get("LOCAL_MAX_NEW_TOKENS", cls.local_max_new_tokens)),
+            context_max_tokens=int(env.get("CONTEXT_MAX_TOKENS", cls.context_max_tokens)),
+            seq2seq_context_tokens=int(env.get("CONTEXT_MAX_TOKENS_SEQ2SEQ", cls.seq2seq_context_tokens)),
+            summary_mode=env.get("CONTEXT_SUMMARY_MODE", cls.summary_mode).lower(),
+            summary_max_tokens=int(env.get("CONTEXT_SUMMARY_MAX_TOKENS", cls.summary_max_tokens)),
+            summary_refresh_turns=int(env.get("CONTEXT_SUMMARY_REFRESH_TURNS", cls.summary_refresh_turns)),
+            summary_input_tokens=int(env.get("CONTEXT_SUMMARY_INPUT_TOKENS", cls.summary_input_tokens)),
+            summary_concurrency=int(env.get("CONTEXT_SUMMARY_CONCURRENCY", cls.summary_concurrency)),
+            summary_cache_max=int(env.get("CONTEXT_SUMMARY_CACHE_MAX", cls.summary_cache_max)),
+            provider_order=tuple(
+                name.strip() for name in env.get("PROVIDER_ORDER", ",".join(cls.provider_order)).split(",") if name.strip()
+            ),
+        )
+
+    def changed(self, other: "Settings") -> List[str]:
+        return [f.name for f in fields(self) if getattr(self, f.name) != getattr(other, f.name)]
+
+
+class SettingsStore:
+    """Reads the environment once and reloads it when the ``.env`` file changes.
+
+    Variables set in the real process environment win over ``.env`` (as with
+    ``load_dotenv``), including on reload. ``watch`` polls the file's mtime
+    every SETTINGS_RELOAD_SECONDS and calls the registered listeners with
+    (old, new) settings.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or find_dotenv()
+        self.reload_interval = float(os.getenv("SETTINGS_RELOAD_SECONDS", "5"))
+        self._process_env = set(os.environ)
+        self._from_dotenv: set = set()
+        self._mtime = self._stat()
+        self._listeners: List[Callable[[Settings, Settings], None]] = []
+        self._apply_dotenv()
+        self.current = Settings.from_env()
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime if self.path else None
+        except OSError:
+            return None
+
+    def _apply_dotenv(self) -> None:
+        values = dotenv_values(self.path) if self.path else {}
+        # keys deleted from .env fall back to their defaults
+        for key in self._from_dotenv - set(values):
+            os.environ.pop(key, None)
+        self._from_dotenv = set()
+        for key, value in values.items():
+            if key not in self._process_env and value is not None:
+                os.environ[key] = value
+                self._from_dotenv.add(key)
+
+    def on_change(self, listener: Callable[[Settings, Settings], None]) -> None:
+        self._listeners.append(listener)
+
+    def reload(self) -> bool:
+        """Re-read ``.env`` if it changed; returns True when the settings changed."""
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        self._apply_dotenv()
+        new = Settings.from_env()
+        old, self.current = self.current, new
+        changed = old.changed(new)
+        if not changed:
+            return False
+        logger.info("Reloaded provider settings: %s changed", ", ".join(changed))
+        for listener in self._listeners:
+            listener(old, new)
+        return True
+
+    async def watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Failed to reload settings from %s", self.path)